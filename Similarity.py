@@ -5,7 +5,9 @@ from __future__ import annotations
 
 from typing import Any, Union
 import math
-import project
+import time
+from instrumentation import is_enabled, record, stage
+from ranking import top_k
 
 
 class _ReviewVertex:
@@ -50,6 +52,14 @@ class _ReviewVertex:
     def get_consice_similarity(self, other: _ReviewVertex) -> float:
         """the function that can help to get the consice similarity of two users.
 
+        """
+        user1, user2 = self.get_rating_lists(other)
+        return consice_similarity(user1, user2)
+
+    def get_rating_lists(self, other: _ReviewVertex) -> tuple[list, list]:
+        """the function that lines up the ratings of two users for consice_similarity, with
+        'N/A' for every item only one of them rated.
+
         """
         user1 = []
         user2 = []
@@ -66,7 +76,7 @@ class _ReviewVertex:
                 user1.append('N/A')
                 user2.append(other.neighbours[item])
 
-        return consice_similarity(user1, user2)
+        return user1, user2
 
 
 class GameRecommendationGraph:
@@ -143,6 +153,31 @@ class GameRecommendationGraph:
         else:
             return set(self._vertices.keys())
 
+    def get_kind(self, item: Any) -> str:
+        """Return the kind of the vertex with the given item: 'user' or 'game'.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        return self._vertices[item].kind
+
+    def get_url(self, item: Any) -> str:
+        """Return the url page of the vertex with the given item.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        return self._vertices[item].get_url()
+
+    def get_neighbours(self, item: Any) -> dict[Any, Union[int, float]]:
+        """Return a dictionary mapping each neighbour item of the given item to the
+        weight of the edge between them.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        return {v.item: weight for v, weight in self._vertices[item].neighbours.items()}
+
 ################################################################################################
 # the following codes are our main body of the graph
 ################################################################################################
@@ -168,16 +203,10 @@ class GameRecommendationGraph:
         """
         if player in self._vertices:
             users = self.get_all_vertices(kind='user')
-            users_score = [(self.get_two_items_similarity_score(user, player), user)
-                           for user in users if user != player]
-            users_score.sort(reverse=True)
-            strict_users = users_score[:limit]
-            result = []
-            for single in strict_users:
-                if single[1] not in result and single[0] > 0:
-                    result.append((single[1], self._vertices[single[1]].get_url()))
-
-            return result
+            users_score = self._score_all(users, player)
+            with stage('sort'):
+                return [(user, self._vertices[user].get_url())
+                        for user, score in top_k(users_score, limit) if score > 0]
         else:
             return 'out of range'
 
@@ -199,20 +228,35 @@ class GameRecommendationGraph:
 
         """
         games = self.get_all_vertices(kind='game')
-        games_scores = [(x, self.get_two_items_similarity_score(x, game))
-                        for x in games if x != game]
+        games_scores = self._score_all(games, game)
 
-        s1 = sorted(games_scores, key=lambda x: x[0], reverse=True)
-        s2 = sorted(s1, key=lambda x: x[1], reverse=True)
+        with stage('sort'):
+            return [x for x, score in top_k(games_scores, limit) if score != 0]
 
-        recommend_so_far = []
-        for i in range(0, limit):
-            if s2[i][1] == 0:
-                return recommend_so_far
-            else:
-                recommend_so_far.append(s2[i][0])
+    def _score_all(self, items: set, target: Any) -> list[tuple[Any, float]]:
+        """Return the (item, similarity score to target) pair of every item other than target.
 
-        return recommend_so_far
+        While the stages are timed, building the rating lists of every pair counts as the
+        'build_vectors' stage and scoring them as the 'score' stage. Both are added up over
+        the whole loop and recorded once, so the timers cost three clock reads per pair.
+        """
+        if not is_enabled():
+            return [(x, self.get_two_items_similarity_score(x, target))
+                    for x in items if x != target]
+
+        other = self._vertices[target]
+        scores, building, scoring = [], 0.0, 0.0
+        for x in items:
+            if x != target:
+                start = time.perf_counter()
+                user1, user2 = self._vertices[x].get_rating_lists(other)
+                middle = time.perf_counter()
+                scores.append((x, consice_similarity(user1, user2)))
+                building += middle - start
+                scoring += time.perf_counter() - middle
+        record('build_vectors', building)
+        record('score', scoring)
+        return scores
 
 
 ####################################################################################################
@@ -230,23 +274,26 @@ def load_weighted_graph(reviews_file: str, game_names_file: str) -> GameRecommen
     format of game_files: {'id': ('app_name', 'url')}
     format of user_files: {'user_id': ([{'item_id': 'recommend'},...], 'user_url')}
     """
+    import project
+
     user_files = project.filter_the_reviews_data(reviews_file)
     game_files = project.filter_the_games_data(game_names_file)
 
     graph = GameRecommendationGraph()
 
-    for user_id in user_files:
-        graph.add_vertex(item=user_id, kind='user', url=user_files[user_id][1])
-
-        for review in user_files[user_id][0]:
-            if review != []:
-                key = [x for x in review][0]
-                if key in game_files:
-                    graph.add_vertex(game_files[key][0], 'game', game_files[key][1])
-                    if review[key] == 'True':
-                        graph.add_edge(user_id, game_files[key][0], weight=1)
-                    else:  # review[key] == 'False'
-                        graph.add_edge(user_id, game_files[key][0], weight=0)
+    with stage('insert'):
+        for user_id in user_files:
+            graph.add_vertex(item=user_id, kind='user', url=user_files[user_id][1])
+
+            for review in user_files[user_id][0]:
+                if review != []:
+                    key = [x for x in review][0]
+                    if key in game_files:
+                        graph.add_vertex(game_files[key][0], 'game', game_files[key][1])
+                        if review[key] == 'True':
+                            graph.add_edge(user_id, game_files[key][0], weight=1)
+                        else:  # review[key] == 'False'
+                            graph.add_edge(user_id, game_files[key][0], weight=0)
 
     return graph
 
@@ -0,0 +1,180 @@
+"""
+CSC111 Final Project: Batch recommendations for every user or every game
+
+Usage:
+    python batch_recommend.py users --output friends.csv
+    python batch_recommend.py games --output neighbours.npz --workers 4
+"""
+from __future__ import annotations
+from typing import Any, Iterator, Optional
+import argparse
+import csv
+import json
+import sys
+import time
+import numpy as np
+from sparse_graph import SparseRecommendationGraph
+
+# the number of scores computed at once by one worker, which bounds its memory use
+BLOCK_CELLS = 1 << 21
+
+# the graph and tie-breaking ranks of a worker process, set once when the worker starts
+_WORKER_STATE = {}
+
+
+def run_batch(graph: Any, kind: str, limit: int, output: str, workers: int = 1,
+              block_size: Optional[int] = None) -> dict:
+    """Compute the limit most similar vertices of every vertex of the given kind, write them
+    to output, and return the throughput of the run.
+
+    graph may be a GameRecommendationGraph or a SparseRecommendationGraph. The vertices are
+    scored in blocks of block_size rows, each with one sparse matrix-matrix product, so that
+    no query walks the graph in Python. With workers > 1, the blocks are spread across a pool
+    of that many processes. The neighbours and their order are the same as
+    find_similar_player and recommend_games give for each vertex.
+
+    If output ends with '.csv', one (item, rank, neighbour, score) row per neighbour is
+    written as soon as its block is done. Otherwise output is a .npz file in the layout of
+    NeighbourIndex.save, written once all the blocks are done; it holds 6 bytes per neighbour.
+
+    Return a dictionary with the number of items, the elapsed seconds and the items per second.
+
+    Preconditions:
+        - kind in {'user', 'game'}
+        - limit >= 1
+        - workers >= 1
+        - block_size is None or block_size >= 1
+    """
+    start_time = time.perf_counter()
+    if not isinstance(graph, SparseRecommendationGraph):
+        graph = SparseRecommendationGraph.from_graph(graph)
+    items = graph.get_vertex_table(kind)[0]
+    n = len(items)
+    block_size = block_size or max(1, BLOCK_CELLS // max(n, 1))
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[sorted(range(n), key=items.__getitem__)] = np.arange(n)
+
+    starts = list(range(0, n, block_size))
+    ends = [min(s + block_size, n) for s in starts]
+    if output.endswith('.csv'):
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['item', 'rank', 'neighbour', 'score'])
+            for block_start, (neighbours, scores) in _blocks(graph, kind, limit, ranks, starts,
+                                                            ends, workers):
+                for i, row in enumerate(neighbours.tolist()):
+                    for rank, j in enumerate(row):
+                        if j != -1:
+                            writer.writerow([items[block_start + i], rank + 1, items[j],
+                                             scores[i, rank] / 100])
+    else:
+        neighbours = np.full((n, limit), -1, dtype=np.int32)
+        scores = np.zeros((n, limit), dtype=np.int16)
+        for block_start, (block_neighbours, block_scores) in _blocks(graph, kind, limit, ranks,
+                                                                    starts, ends, workers):
+            block_end = block_start + len(block_neighbours)
+            neighbours[block_start:block_end] = block_neighbours
+            scores[block_start:block_end] = block_scores
+        with open(output, 'wb') as f:
+            np.savez(f, names=np.array(items, dtype=str), neighbours=neighbours, scores=scores)
+
+    seconds = time.perf_counter() - start_time
+    return {'kind': kind, 'items': n, 'workers': workers, 'seconds': round(seconds, 3),
+            'items_per_second': round(n / seconds, 1) if seconds > 0 else float('inf')}
+
+
+def _blocks(graph: SparseRecommendationGraph, kind: str, limit: int, ranks: np.ndarray,
+            starts: list[int], ends: list[int], workers: int) \
+        -> Iterator[tuple[int, tuple[np.ndarray, np.ndarray]]]:
+    """Yield the (start, top neighbours) of every block, in order, as soon as it is done.
+    """
+    _init_worker(graph, kind, limit, ranks)
+    if workers == 1:
+        for start, end in zip(starts, ends):
+            yield start, _top_block(start, end)
+        return
+
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                initargs=(graph, kind, limit, ranks)) as executor:
+        yield from zip(starts, executor.map(_top_block, starts, ends))
+
+
+def _init_worker(graph: SparseRecommendationGraph, kind: str, limit: int,
+                 ranks: np.ndarray) -> None:
+    """Remember what _top_block needs in this process.
+    """
+    _WORKER_STATE.update(graph=graph, kind=kind, limit=limit, ranks=ranks)
+
+
+def _top_block(start: int, end: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the top neighbours of the vertices with a dense id in range(start, end), as an
+    int32 array of neighbour ids padded with -1 and an int16 array of scores times 100.
+
+    Ties are broken by item descending, through the rank of each item in sorted order, so that
+    a whole block is ranked with a single argpartition.
+    """
+    ranks, limit = _WORKER_STATE['ranks'], _WORKER_STATE['limit']
+    scores = _WORKER_STATE['graph'].similarity_block(_WORKER_STATE['kind'], start, end)
+    hundredths = np.rint(scores * 100).astype(np.int64)
+    # one distinct key per (score, item): positive scores only, higher is better
+    keys = np.where(hundredths > 0, hundredths * len(ranks) + ranks, -1)
+
+    width = min(limit, keys.shape[1])
+    if width < keys.shape[1]:
+        top = np.argpartition(-keys, width - 1, axis=1)[:, :width]
+    else:
+        top = np.broadcast_to(np.arange(width), keys.shape).copy()
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1),
+                             axis=1)
+
+    neighbours = np.full((end - start, limit), -1, dtype=np.int32)
+    top_scores = np.zeros((end - start, limit), dtype=np.int16)
+    found = np.take_along_axis(keys, top, axis=1) > 0
+    neighbours[:, :width] = np.where(found, top, -1)
+    top_scores[:, :width] = np.where(found, np.take_along_axis(hundredths, top, axis=1), 0)
+    return neighbours, top_scores
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Return the parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(prog='batch_recommend',
+                                     description='Recommend for every user or every game.')
+    parser.add_argument('kind', choices=['users', 'games'],
+                        help='find similar players for every user, or similar games for '
+                             'every game')
+    parser.add_argument('--output', required=True,
+                        help='a .csv file, written as it goes, or a .npz file')
+    parser.add_argument('--limit', type=int, default=10,
+                        help='the number of recommendations per item (default: 10)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='the number of worker processes (default: 1)')
+    parser.add_argument('--block-size', type=int,
+                        help='the number of items scored together by one worker')
+    parser.add_argument('--reviews', default='australian_user_reviews.json',
+                        help='the user reviews dataset')
+    parser.add_argument('--games', default='steam_games.json', help='the steam games dataset')
+    parser.add_argument('--cache', default='.graph_cache',
+                        help='the directory of the graph snapshot')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the batch job asked for on the command line, print its throughput as JSON, and
+    return the exit status.
+    """
+    args = parse_args(argv)
+
+    import project_total
+    from snapshot import load_cached_graph
+    graph = load_cached_graph(args.reviews, args.games, args.cache,
+                              project_total.load_weighted_graph, SparseRecommendationGraph)
+    stats = run_batch(graph, args.kind[:-1], args.limit, args.output, args.workers,
+                      args.block_size)
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
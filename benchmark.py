@@ -0,0 +1,306 @@
+"""
+CSC111 Final Project: Benchmarks of loading the datasets and answering queries
+
+Usage:
+    python benchmark.py --users 10000 100000 --games 5000 --output bench_output.txt
+
+Every dataset size is generated as synthetic files in the format of
+'australian_user_reviews.json' and 'steam_games.json', and benchmarked in a fresh process,
+so that the peak memory of one size does not carry over to the next. The report is JSON.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# every stage that can be benchmarked, in the order they run
+STAGES = ('open_user_review', 'open_steam_games', 'load_weighted_graph', 'find_similar_player',
+          'find_similar_player_lsh', 'recommend_games')
+
+
+####################################################################################################
+# synthetic datasets
+####################################################################################################
+
+
+def generate_dataset(directory: str, n_users: int, n_games: int, mean_reviews: float = 4.0,
+                     alpha: float = 1.2, seed: int = 0) -> tuple[str, str]:
+    """Write a synthetic reviews file and games file to directory, and return their paths.
+
+    Game popularity follows a power law: the game of rank r is reviewed with a probability
+    proportional to 1 / r ** alpha. Every user reviews a random number of distinct games,
+    mean_reviews on average, and recommends each of them with probability 0.85. The files
+    are written one line at a time, so any size fits in memory.
+
+    Preconditions:
+        - n_users >= 0
+        - n_games >= 1
+        - mean_reviews >= 0
+        - alpha > 0
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    reviews_file = os.path.join(directory, 'australian_user_reviews.json')
+    games_file = os.path.join(directory, 'steam_games.json')
+
+    with open(games_file, 'w', encoding='utf-8') as f:
+        for g in range(n_games):
+            game_id, name = str(10000 + g), 'Game ' + str(g)
+            f.write(repr({'publisher': 'Publisher ' + str(g % 97), 'genres': ['Action'],
+                          'app_name': name, 'title': name,
+                          'url': 'http://store.steampowered.com/app/' + game_id + '/'
+                                 + name.replace(' ', '_') + '/',
+                          'tags': rng.sample(['Action', 'Indie', 'RPG', 'Strategy', 'Casual',
+                                              'Puzzle', 'Horror'], 3),
+                          'price': 4.99, 'early_access': False, 'id': game_id}) + '\n')
+
+    cumulative, total = [], 0.0
+    for rank in range(1, n_games + 1):
+        total += 1 / rank ** alpha
+        cumulative.append(total)
+
+    with open(reviews_file, 'w', encoding='utf-8') as f:
+        for u in range(n_users):
+            user_id = str(76561197960265728 + u)
+            count = min(int(rng.expovariate(1 / mean_reviews)) if mean_reviews > 0 else 0,
+                        n_games)
+            games = set(rng.choices(range(n_games), cum_weights=cumulative, k=count))
+            reviews = [{'funny': '', 'posted': 'Posted May 20, 2014.', 'last_edited': '',
+                        'item_id': str(10000 + g), 'helpful': 'No ratings yet',
+                        'recommend': rng.random() < 0.85, 'review': 'great game!'}
+                       for g in sorted(games)]
+            f.write(repr({'user_id': user_id,
+                          'user_url': 'http://steamcommunity.com/profiles/' + user_id,
+                          'reviews': reviews}) + '\n')
+
+    return reviews_file, games_file
+
+
+####################################################################################################
+# measurements
+####################################################################################################
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Return the p-th percentile of the given sorted values, by the nearest-rank method.
+
+    Preconditions:
+        - sorted_values == sorted(sorted_values)
+        - sorted_values != []
+        - 0 < p <= 100
+
+    >>> percentile([1, 2, 3, 4], 50)
+    2
+    >>> percentile([1, 2, 3, 4], 99)
+    4
+    """
+    rank = -(-len(sorted_values) * p // 100)
+    return sorted_values[max(int(rank), 1) - 1]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Return the peak resident memory of this process so far, in megabytes, or None if it
+    cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+def measure(calls: list[Callable[[], Any]], items: Optional[int] = None) -> dict:
+    """Run every call in order, and return its latency percentiles in milliseconds and the
+    throughput in items per second.
+
+    items is the number of items the calls process together, such as the number of queries
+    answered. If it is None, every call returns the number of items it processed instead,
+    such as the number of lines it read.
+
+    Preconditions:
+        - calls != []
+    """
+    latencies, counted = [], 0
+    for call in calls:
+        start = time.perf_counter()
+        processed = call()
+        latencies.append(time.perf_counter() - start)
+        if items is None:
+            counted += processed
+    items = counted if items is None else items
+    seconds = sum(latencies)
+    latencies.sort()
+    return {'calls': len(calls), 'seconds': round(seconds, 4),
+            'throughput_per_second': round(items / seconds, 1) if seconds > 0 else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3)}
+
+
+def run_benchmark(reviews_file: str, games_file: str, queries: int = 100,
+                  stages: tuple = STAGES, seed: int = 0) -> dict:
+    """Benchmark the given stages on the given dataset, and return the results by stage.
+
+    The query stages answer queries random users or games with limit 10, with the result
+    cache of the graph turned off so that every query is computed.
+    """
+    import project_total
+
+    rng = random.Random(seed)
+    results = {}
+    if 'open_user_review' in stages:
+        results['open_user_review'] = measure(
+            [lambda: len(project_total.open_user_review(reviews_file))])
+    if 'open_steam_games' in stages:
+        results['open_steam_games'] = measure(
+            [lambda: len(project_total.open_steam_games(games_file))])
+
+    if not {'load_weighted_graph', 'find_similar_player', 'find_similar_player_lsh',
+            'recommend_games'} & set(stages):
+        return results
+    graphs = []
+
+    def load() -> int:
+        """Load the graph, and return its number of users."""
+        graphs.append(project_total.load_weighted_graph(reviews_file, games_file))
+        return len(graphs[0].get_all_vertices(kind='user'))
+
+    loaded = measure([load])
+    graph = graphs[0]
+    graph.configure_cache(maxsize=0)
+    users = sorted(graph.get_all_vertices(kind='user'))
+    games = sorted(graph.get_all_vertices(kind='game'))
+    if 'load_weighted_graph' in stages:
+        results['load_weighted_graph'] = loaded
+
+    if 'find_similar_player' in stages and users:
+        sample = [rng.choice(users) for _ in range(queries)]
+        results['find_similar_player'] = measure(
+            [lambda u=u: graph.find_similar_player(u, 10) for u in sample], queries)
+    if 'find_similar_player_lsh' in stages and users:
+        results['find_similar_player_lsh'] = _benchmark_lsh(
+            graph, [rng.choice(users) for _ in range(queries)])
+    if 'recommend_games' in stages and games:
+        sample = [rng.choice(games) for _ in range(queries)]
+        results['recommend_games'] = measure(
+            [lambda g=g: graph.recommend_games(g, 10) for g in sample], queries)
+    return results
+
+
+def _benchmark_lsh(graph: Any, sample: list) -> dict:
+    """Return the measure results of find_similar_player with approximate=True on the given
+    users, together with the time to build the MinHashLSH index it uses, the mean number of
+    candidates it scores, and its recall: the fraction of the exact top 10 that it returns.
+    """
+    from minhash_lsh import MinHashLSH
+
+    start = time.perf_counter()
+    index = MinHashLSH(graph)
+    build_seconds = time.perf_counter() - start
+    graph.attach_lsh_index(index)
+    result = measure([lambda u=u: graph.find_similar_player(u, 10, approximate=True)
+                      for u in sample], len(sample))
+
+    found = wanted = 0
+    for user in sample:
+        exact = graph.find_similar_player(user, 10)
+        approximate = graph.find_similar_player(user, 10, approximate=True)
+        if isinstance(exact, list):
+            wanted += len(exact)
+            if isinstance(approximate, list):
+                found += len(set(exact) & set(approximate))
+    result['build_seconds'] = round(build_seconds, 3)
+    result['mean_candidates'] = round(sum(len(index.candidates(user)) for user in sample)
+                                      / len(sample), 1)
+    result['recall_at_10'] = round(found / wanted, 3) if wanted > 0 else None
+    return result
+
+
+def benchmark_size(n_users: int, n_games: int, queries: int, stages: tuple,
+                   directory: str, seed: int) -> dict:
+    """Generate a dataset of the given size in directory, benchmark it, and return the report
+    of this size.
+
+    The peak memory is that of the whole process, so it is reported once for the size, not
+    per stage. Run this in a fresh process for every size, as main does.
+    """
+    start = time.perf_counter()
+    reviews_file, games_file = generate_dataset(directory, n_users, n_games, seed=seed)
+    generated = time.perf_counter() - start
+    return {'users': n_users, 'games': n_games, 'queries': queries,
+            'generate_seconds': round(generated, 3),
+            'reviews_file_mb': round(os.path.getsize(reviews_file) / (1 << 20), 2),
+            'stages': run_benchmark(reviews_file, games_file, queries, stages, seed),
+            'peak_rss_mb': peak_rss_mb()}
+
+
+####################################################################################################
+# command line
+####################################################################################################
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Return the parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(prog='benchmark',
+                                     description='Benchmark loading and querying on '
+                                                 'synthetic datasets.')
+    parser.add_argument('--users', type=int, nargs='+', default=[10000],
+                        help='the numbers of users to benchmark (default: 10000)')
+    parser.add_argument('--games', type=int, default=5000,
+                        help='the number of games (default: 5000)')
+    parser.add_argument('--queries', type=int, default=100,
+                        help='the number of queries per query stage (default: 100)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES),
+                        help='the stages to benchmark (default: all of them)')
+    parser.add_argument('--seed', type=int, default=0, help='the random seed (default: 0)')
+    parser.add_argument('--data-dir',
+                        help='keep the generated datasets in this directory instead of a '
+                             'temporary one')
+    parser.add_argument('--output', help='write the JSON report to this file instead of '
+                                         'printing it')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the benchmarks asked for on the command line, and return the exit status.
+    """
+    args = parse_args(argv)
+    directory = args.data_dir or tempfile.mkdtemp(prefix='steam_bench_')
+    stages = tuple(stage for stage in STAGES if stage in args.stages)
+
+    report = {'python': sys.version.split()[0], 'platform': sys.platform, 'sizes': []}
+    try:
+        for n_users in args.users:
+            # a fresh process for every size keeps the peak memory of each size separate
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+                report['sizes'].append(executor.submit(
+                    benchmark_size, n_users, args.games, args.queries, stages,
+                    os.path.join(directory, str(n_users)), args.seed).result())
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
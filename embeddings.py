@@ -0,0 +1,207 @@
+"""
+CSC111 Final Project: User and game embeddings learned by implicit alternating least squares
+"""
+from __future__ import annotations
+from typing import Any
+import numpy as np
+from ranking import top_k_indices
+from sparse_graph import SparseRecommendationGraph
+
+
+class Embeddings:
+    """Low-dimensional float32 embeddings of the users and games of a recommendation graph.
+
+    The embeddings are trained offline by implicit alternating least squares (Hu, Koren and
+    Volinsky, 2008). Every rating in the graph is an observation: a positive rating has
+    preference 1 and a rating of 0 has preference 0, both with confidence 1 + alpha, while
+    the pairs without a rating have preference 0 with confidence 1. Each half-step solves the
+    normal equations of every user (or every game) at once, with a few conjugate gradient
+    steps over float32 arrays; the dense products run on numpy's BLAS, which uses every core
+    it is built to.
+
+    Two users (or two games) are as similar as the cosine of their embeddings, so every score
+    is a dot product of unit vectors. Unlike the consice similarity, this also gives a score
+    to pairs that have no rated game (or no rating user) in common.
+
+    Instance Attributes:
+        - factors: the number of dimensions of every embedding
+
+    Private Instance Attributes:
+        - _names: the user items and the game items, indexed by row, keyed by kind
+        - _rows: map each user item and each game item to its row, keyed by kind
+        - _vectors: the embedding of every user and every game, scaled to length 1 (or left
+          at 0), keyed by kind
+
+    Representation Invariants:
+        - all(self._vectors[kind].shape == (len(self._names[kind]), self.factors)
+              for kind in {'user', 'game'})
+    """
+    factors: int
+    _names: dict[str, list]
+    _rows: dict[str, dict[Any, int]]
+    _vectors: dict[str, np.ndarray]
+
+    def __init__(self, users: list, user_vectors: np.ndarray, games: list,
+                 game_vectors: np.ndarray) -> None:
+        """Initialize embeddings from their items and their float32 vectors of length 1 (or 0),
+        one row per item.
+
+        Use Embeddings.train or Embeddings.load to create embeddings.
+        """
+        self.factors = user_vectors.shape[1]
+        self._names = {'user': users, 'game': games}
+        self._rows = {kind: {item: i for i, item in enumerate(items)}
+                      for kind, items in self._names.items()}
+        self._vectors = {'user': user_vectors, 'game': game_vectors}
+
+    @classmethod
+    def train(cls, graph: Any, factors: int = 64, regularization: float = 0.1,
+              alpha: float = 40.0, iterations: int = 15, cg_steps: int = 3,
+              seed: int = 0) -> Embeddings:
+        """Return the embeddings of the users and games of the given graph, trained with the
+        given number of factors, L2 regularization, confidence scale, number of alternating
+        iterations and number of conjugate gradient steps per half-step.
+
+        graph may be a GameRecommendationGraph or a SparseRecommendationGraph.
+
+        Preconditions:
+            - factors >= 1
+            - regularization > 0
+            - alpha >= 0
+            - iterations >= 1
+            - cg_steps >= 1
+        """
+        if not isinstance(graph, SparseRecommendationGraph):
+            graph = SparseRecommendationGraph.from_graph(graph)
+        users, games = graph.get_vertex_table('user')[0], graph.get_vertex_table('game')[0]
+        csr, csc = graph.get_csr(), graph.get_csc()
+
+        rng = np.random.default_rng(seed)
+        user_vectors = (rng.standard_normal((len(users), factors)) * 0.01).astype(np.float32)
+        game_vectors = (rng.standard_normal((len(games), factors)) * 0.01).astype(np.float32)
+        for _ in range(iterations):
+            user_vectors = _solve_rows(game_vectors, csr, user_vectors, alpha, regularization,
+                                       cg_steps)
+            game_vectors = _solve_rows(user_vectors, csc, game_vectors, alpha, regularization,
+                                       cg_steps)
+
+        return cls(list(users), _unit_rows(user_vectors), list(games), _unit_rows(game_vectors))
+
+    @classmethod
+    def load(cls, path: str) -> Embeddings:
+        """Return the embeddings saved at the given path by Embeddings.save.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['users'].tolist(), data['user_vectors'], data['games'].tolist(),
+                       data['game_vectors'])
+
+    def save(self, path: str) -> None:
+        """Save these embeddings to the given path, in numpy's .npz format.
+        """
+        with open(path, 'wb') as f:
+            np.savez(f, users=np.array(self._names['user'], dtype=str),
+                     user_vectors=self._vectors['user'],
+                     games=np.array(self._names['game'], dtype=str),
+                     game_vectors=self._vectors['game'])
+
+    def __contains__(self, item: Any) -> bool:
+        """Return whether the given user or game has an embedding.
+        """
+        return item in self._rows['user'] or item in self._rows['game']
+
+    def similarity_scores(self, item: Any) -> np.ndarray:
+        """Return the cosine of the embedding of the given item with that of every item of the
+        same kind, as an array indexed by row. The score of the item with itself is 0.
+
+        Preconditions:
+            - item in self
+        """
+        kind = 'user' if item in self._rows['user'] else 'game'
+        i = self._rows[kind][item]
+        scores = self._vectors[kind] @ self._vectors[kind][i]
+        scores[i] = 0
+        return scores
+
+    def top_similar(self, item: Any, limit: int) -> list[tuple[Any, float]]:
+        """Return the (item, score) pairs of the limit items of the same kind whose embeddings
+        have the highest positive cosine with that of the given item, best first, with ties
+        ordered by item descending.
+
+        Preconditions:
+            - item in self
+        """
+        names = self._names['user' if item in self._rows['user'] else 'game']
+        scores = self.similarity_scores(item)
+        candidates = np.flatnonzero(scores > 0)
+        best = top_k_indices(scores[candidates], [names[j] for j in candidates.tolist()], limit)
+        return [(names[j], float(scores[j])) for j in candidates[best].tolist()]
+
+
+def _solve_rows(fixed: np.ndarray, matrix: tuple[np.ndarray, np.ndarray, np.ndarray],
+                current: np.ndarray, alpha: float, regularization: float,
+                steps: int) -> np.ndarray:
+    """Return the embeddings of the rows of the given compressed sparse rating matrix that
+    approximately minimize the implicit ALS loss, given the fixed embeddings of its columns.
+
+    Row u solves (F^T F + alpha * F_u^T F_u + regularization * I) x = (1 + alpha) * F_u^T p_u,
+    where F_u are the fixed embeddings of the columns rated in row u and p_u its preferences.
+    Every row takes the given number of conjugate gradient steps from its current embedding,
+    all rows at once, so a step costs one dense product with F^T F and two passes over the
+    ratings instead of a factorization of every row's matrix (Takacs, Pilaszy and Tikk, 2011).
+    """
+    indptr, indices, data = (np.asarray(array) for array in matrix)
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed + np.float32(regularization) * np.eye(factors, dtype=np.float32)
+    rated = fixed[indices]
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+    def product(vectors: np.ndarray) -> np.ndarray:
+        """Return the left-hand side matrix of every row times the row's given vector."""
+        along = np.einsum('ij,ij->i', rated, vectors[rows])
+        return vectors @ gram + np.float32(alpha) * _row_sums(rated * along[:, np.newaxis],
+                                                              indptr)
+
+    preference = (data > 0).astype(np.float32)
+    solved = current.copy()
+    residual = np.float32(1 + alpha) * _row_sums(rated * preference[:, np.newaxis], indptr) \
+        - product(solved)
+    direction = residual.copy()
+    norms = np.einsum('ij,ij->i', residual, residual)
+    for _ in range(steps):
+        moved = product(direction)
+        curvature = np.einsum('ij,ij->i', direction, moved)
+        step = np.divide(norms, curvature, out=np.zeros_like(norms), where=curvature > 0)
+        solved += step[:, np.newaxis] * direction
+        residual -= step[:, np.newaxis] * moved
+        new_norms = np.einsum('ij,ij->i', residual, residual)
+        ratio = np.divide(new_norms, norms, out=np.zeros_like(norms), where=norms > 0)
+        direction = residual + ratio[:, np.newaxis] * direction
+        norms = new_norms
+    return solved
+
+
+def _row_sums(values: np.ndarray, indptr: np.ndarray) -> np.ndarray:
+    """Return the sums of the given per-rating rows over every row of a compressed sparse
+    matrix with the given indptr, with a sum of 0 for the rows without ratings.
+    """
+    padded = np.concatenate([values, np.zeros((1, values.shape[1]), dtype=values.dtype)])
+    sums = np.add.reduceat(padded, indptr[:-1], axis=0)
+    sums[indptr[:-1] == indptr[1:]] = 0
+    return sums
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return the given float32 vectors scaled to length 1, leaving zero vectors at 0.
+    """
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(lengths > 0, lengths, 1)).astype(np.float32)
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'ranking', 'sparse_graph'],
+        'allowed-io': ['Embeddings.save'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,203 @@
+"""
+CSC111 Final Project: Opt-in timing of the stages of loading and recommending
+"""
+from __future__ import annotations
+from typing import Any, Callable, Iterable, Iterator, Optional
+import functools
+import json
+import time
+
+# the stages the loading and recommending code paths report, in pipeline order
+STAGES = ('read', 'replace_quotes', 'split_lines', 'json_decode', 'filter', 'insert',
+          'build_vectors', 'score', 'sort')
+
+# whether stages are being timed; nothing is recorded, and almost no time is spent, when False
+_enabled = [False]
+
+# map each stage to [number of calls, total seconds]
+_totals = {}
+
+
+def enable() -> None:
+    """Start timing the stages.
+    """
+    _enabled[0] = True
+
+
+def disable() -> None:
+    """Stop timing the stages. The numbers recorded so far are kept.
+    """
+    _enabled[0] = False
+
+
+def is_enabled() -> bool:
+    """Return whether the stages are being timed.
+    """
+    return _enabled[0]
+
+
+def reset() -> None:
+    """Forget the numbers recorded so far.
+    """
+    _totals.clear()
+
+
+def stats() -> dict[str, dict[str, float]]:
+    """Return the number of calls and the total wall time, in seconds, of every stage that
+    was timed, in pipeline order.
+
+    >>> reset()
+    >>> enable()
+    >>> with stage('filter'):
+    ...     pass
+    >>> disable()
+    >>> stats()['filter']['calls']
+    1
+    """
+    order = {name: i for i, name in enumerate(STAGES)}
+    return {name: {'calls': calls, 'seconds': round(seconds, 6)}
+            for name, (calls, seconds) in sorted(_totals.items(),
+                                                 key=lambda pair: order.get(pair[0], len(order)))}
+
+
+def dump(path: str) -> None:
+    """Write the numbers returned by stats to the given file, as JSON.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(stats(), f, indent=2)
+
+
+def record(name: str, seconds: float) -> None:
+    """Add one call of the given number of seconds to the given stage.
+    """
+    totals = _totals.setdefault(name, [0, 0.0])
+    totals[0] += 1
+    totals[1] += seconds
+
+
+class _Stage:
+    """A context manager that adds the time spent in its block to a stage.
+
+    Instance Attributes:
+        - name: the name of the stage
+        - start: the time.perf_counter() time at which the block was entered
+    """
+    name: str
+    start: float
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        record(self.name, time.perf_counter() - self.start)
+
+
+class _NoStage:
+    """A context manager that does nothing, used while timing is disabled.
+    """
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str) -> Any:
+    """Return a context manager that adds the time spent in its block to the given stage.
+
+    Use it as `with stage('score'): ...`. While timing is disabled, this returns a context
+    manager that does nothing.
+    """
+    return _Stage(name) if _enabled[0] else _NO_STAGE
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Return a decorator that adds the time spent in every call of the decorated function
+    to the given stage.
+
+    While timing is disabled, a call only costs one extra check.
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled[0]:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def timed_iter(name: str, iterable: Iterable) -> Iterable:
+    """Return an iterable over the given iterable that adds the time spent getting every
+    element to the given stage.
+
+    While timing is disabled, this returns the iterable itself.
+    """
+    if not _enabled[0]:
+        return iterable
+    return _timed_iter(name, iter(iterable))
+
+
+def _timed_iter(name: str, iterator: Iterator) -> Iterator:
+    """Yield the elements of iterator, timing how long each one takes to get.
+    """
+    while True:
+        start = time.perf_counter()
+        try:
+            element = next(iterator)
+        except StopIteration:
+            record(name, time.perf_counter() - start)
+            return
+        record(name, time.perf_counter() - start)
+        yield element
+
+
+def profile(call: Callable[[], Any], path: Optional[str] = None, limit: int = 25) \
+        -> tuple[Any, str]:
+    """Run call under cProfile, and return its result together with the profile of the
+    limit functions with the most cumulative time, as text.
+
+    If path is given, also save the full profile there, for pstats or a profile viewer.
+    The stages are timed during the call as well, whether or not timing is enabled.
+    """
+    import cProfile
+    import io
+    import pstats
+
+    was_enabled = _enabled[0]
+    enable()
+    profiler = cProfile.Profile()
+    try:
+        result = profiler.runcall(call)
+    finally:
+        _enabled[0] = was_enabled
+    if path is not None:
+        profiler.dump_stats(path)
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(limit)
+    return result, text.getvalue()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['cProfile', 'functools', 'io', 'json', 'pstats', 'time'],
+        'allowed-io': ['dump'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,212 @@
+"""
+CSC111 Final Project: Approximate similar-player search with MinHash and LSH
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import numpy as np
+from sparse_graph import SparseRecommendationGraph
+
+# the Mersenne prime 2^31 - 1, the modulus of the MinHash hash functions
+_PRIME = (1 << 31) - 1
+
+
+class MinHashLSH:
+    """A locality-sensitive hashing index over the games that every user recommends.
+
+    Each user is seen as the set of games they gave a positive rating; edges of weight 0 add
+    nothing to the consice similarity, so they are left out. Every set gets a MinHash
+    signature of num_perm values, which is cut into bands of num_perm // bands values each. Two
+    users whose signatures agree on a whole band land in the same bucket of that band, and
+    only users that share a bucket with the query user are scored exactly.
+
+    More bands, or fewer values per band, give a higher recall and more candidates to score;
+    probing fewer bands at query time trades recall back for speed. The candidates are scored
+    all at once, from their rows of the graph this index was built from, so a query costs time
+    in proportion to the candidates' ratings, not to the number of users.
+
+    Measured with benchmark.generate_dataset(directory, users, 5000) (seed 0), 300 random
+    queries with limit 10, against find_similar_player's exact path (which scores every
+    user from the sparse mirror) and a scan that scores the users one at a time:
+
+        users    exact p50   scan p50   probe_bands   candidates   recall@10   p50
+        20,000   1.1 ms      41 ms      12            749          0.915       0.44 ms
+                                        24 (all)      1,456        0.971       0.61 ms
+        100,000  4.9 ms      215 ms     12            4,257        0.932       0.65 ms
+                                        24 (all)      7,082        0.975       1.39 ms
+
+    Fewer candidates cost recall quickly: 120 hash functions in 40 bands score 782
+    candidates at 20,000 users, but find only 0.916 of the top 10. The index takes 0.3 s to build for 20,000 users and 1.3 s for 100,000.
+    `python benchmark.py --stages find_similar_player find_similar_player_lsh` reproduces the
+    default row.
+
+    Instance Attributes:
+        - num_perm: the number of hash functions in every signature
+        - bands: the number of bands every signature is cut into
+
+    Private Instance Attributes:
+        - _graph: the SparseRecommendationGraph this index was built from, which the
+          candidates are scored against
+        - _users: the indexed user items, indexed by row
+        - _user_ids: the dense id in _graph of every indexed user, indexed by row
+        - _rows: map each indexed user item to its row
+        - _item_ranks: the position of every indexed user item in the sorted list of them,
+          indexed by row, so that ties can be ordered by item without comparing items
+        - _game_ids: map each game item to the id its hashes are computed from
+        - _hash_a, _hash_b: the coefficients of the hash functions (a * game + b) mod _PRIME
+        - _band_mix: random odd multipliers used to combine the values of a band into one key
+        - _band_keys: the bucket key of every user in every band, of shape (bands, users)
+        - _sorted_keys: all the keys of _band_keys, sorted
+        - _sorted_rows: the user of every key in _sorted_keys
+
+    Representation Invariants:
+        - self.num_perm % self.bands == 0
+        - self.bands <= 256
+        - self._band_keys.shape == (self.bands, len(self._users))
+        - len(self._user_ids) == len(self._users)
+    """
+    num_perm: int
+    bands: int
+    _graph: SparseRecommendationGraph
+    _users: list
+    _user_ids: np.ndarray
+    _item_ranks: np.ndarray
+    _rows: dict[Any, int]
+    _game_ids: dict[Any, int]
+    _hash_a: np.ndarray
+    _hash_b: np.ndarray
+    _band_mix: np.ndarray
+    _band_keys: np.ndarray
+    _sorted_keys: np.ndarray
+    _sorted_rows: np.ndarray
+
+    def __init__(self, graph: Any, num_perm: int = 48, bands: int = 24, seed: int = 0) -> None:
+        """Build the index over all the users of the given graph.
+
+        graph may be a GameRecommendationGraph or a SparseRecommendationGraph. The index
+        describes the graph as it is now, so build a new one after adding edges.
+
+        Preconditions:
+            - num_perm % bands == 0
+            - bands <= 256
+        """
+        if not isinstance(graph, SparseRecommendationGraph):
+            graph = SparseRecommendationGraph.from_graph(graph)
+        self._graph = graph
+        self.num_perm = num_perm
+        self.bands = bands
+
+        rng = np.random.default_rng(seed)
+        self._hash_a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._hash_b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 1 << 63, size=num_perm // bands, dtype=np.uint64) | 1
+
+        users, _ = graph.get_vertex_table('user')
+        self._game_ids = {game: j for j, game in enumerate(graph.get_vertex_table('game')[0])}
+        indptr, indices, data = graph.get_csr()
+
+        # keep the positive ratings only, and the users that have at least one of them
+        positive = np.asarray(data) > 0
+        rows = np.repeat(np.arange(len(users)), np.diff(indptr))[positive]
+        games = np.asarray(indices)[positive]
+        keep = np.unique(rows)
+        self._users = [users[i] for i in keep.tolist()]
+        self._user_ids = keep
+        self._item_ranks = np.empty(len(keep), dtype=np.int64)
+        self._item_ranks[sorted(range(len(keep)), key=self._users.__getitem__)] = \
+            np.arange(len(keep))
+        self._rows = {user: i for i, user in enumerate(self._users)}
+
+        signatures = np.empty((len(keep), num_perm), dtype=np.uint64)
+        if len(keep) > 0:
+            starts = np.searchsorted(rows, keep)
+            for p in range(num_perm):
+                hashes = (self._hash_a[p] * games.astype(np.uint64) + self._hash_b[p]) % _PRIME
+                signatures[:, p] = np.minimum.reduceat(hashes, starts)
+
+        self._band_keys = self._keys(signatures).T.copy()
+        order = np.argsort(self._band_keys.ravel(), kind='stable')
+        self._sorted_keys = self._band_keys.ravel()[order]
+        self._sorted_rows = (order % max(len(keep), 1)).astype(np.int32)
+
+    def candidates(self, user: Any, probe_bands: Optional[int] = None,
+                   games: Optional[list] = None) -> list:
+        """Return the users that share a bucket with the given user in at least one of the
+        first probe_bands bands (all the bands by default), not including the user.
+
+        games are the games the user recommends. They are only needed for a user that was not
+        in the graph when this index was built, or whose ratings have changed since.
+        """
+        return [self._users[i] for i in self._candidate_rows(user, probe_bands, games).tolist()]
+
+    def top_similar(self, user: Any, limit: int,
+                    probe_bands: Optional[int] = None) -> list[tuple[Any, float]]:
+        """Return the (user, score) pairs of the limit candidates of the given user with the
+        highest positive consice similarity to them, best first, with ties ordered by user
+        descending. The candidates are the users that candidates(user, probe_bands) returns.
+
+        Preconditions:
+            - limit >= 1
+        """
+        rows = self._candidate_rows(user, probe_bands)
+        if len(rows) == 0:
+            return []
+        scores = self._graph.similarity_to(user, self._user_ids[rows])
+        keep = np.flatnonzero(scores > 0)
+        rows, scores = rows[keep], scores[keep]
+        # lexsort sorts by its last key first, in ascending order
+        best = np.lexsort((self._item_ranks[rows], scores))[::-1][:limit]
+        return [(self._users[rows[b]], float(scores[b])) for b in best.tolist()]
+
+    def _candidate_rows(self, user: Any, probe_bands: Optional[int],
+                        games: Optional[list] = None) -> np.ndarray:
+        """Return the sorted rows of the candidates(user, probe_bands, games) users.
+        """
+        probe_bands = self.bands if probe_bands is None else min(probe_bands, self.bands)
+        if games is not None:
+            keys = self._keys(self._signature(games)[np.newaxis, :])[0]
+        elif user in self._rows:
+            keys = self._band_keys[:, self._rows[user]]
+        else:
+            return np.zeros(0, dtype=np.int64)
+
+        # the buckets of all the probed bands are found in one pass over the sorted keys
+        starts = np.searchsorted(self._sorted_keys, keys[:probe_bands], side='left')
+        lengths = np.searchsorted(self._sorted_keys, keys[:probe_bands], side='right') - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) \
+            + np.arange(lengths.sum())
+        found = np.zeros(len(self._users), dtype=bool)
+        found[self._sorted_rows[offsets]] = True
+        rows = np.flatnonzero(found)
+        if user in self._rows:
+            rows = rows[rows != self._rows[user]]
+        return rows
+
+    def _signature(self, games: list) -> np.ndarray:
+        """Return the MinHash signature of the given games.
+        """
+        ids = np.array([self._game_ids[g] for g in games if g in self._game_ids], dtype=np.uint64)
+        if len(ids) == 0:
+            # an empty set gets a signature no real set can have
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        hashes = (self._hash_a[:, np.newaxis] * ids + self._hash_b[:, np.newaxis]) % _PRIME
+        return hashes.min(axis=1)
+
+    def _keys(self, signatures: np.ndarray) -> np.ndarray:
+        """Return the bucket key of every band of the given signatures, one row per signature.
+
+        The values in a band are combined by a multiply-and-add that wraps around, which
+        keeps the keys 64 bits wide. The top 8 bits of every key then hold its band instead,
+        so the keys of different bands never collide and can all be sorted together.
+        """
+        banded = signatures.reshape(len(signatures), self.bands, -1)
+        keys = (banded * self._band_mix).sum(axis=2, dtype=np.uint64)
+        return (keys >> np.uint64(8)) | (np.arange(self.bands, dtype=np.uint64) << np.uint64(56))
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'sparse_graph'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,195 @@
+"""
+CSC111 Final Project: Precomputed game-to-game neighbour index
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import numpy as np
+from sparse_graph import SparseRecommendationGraph
+
+
+class NeighbourIndex:
+    """The k most similar games of every game in a game recommendation graph.
+
+    The index is built once, offline, with the same consice similarity that
+    GameRecommendationGraph.recommend_games uses, and answers recommend_games queries for at
+    most k games in O(k) time. Neighbours are stored as rows of a fixed-width int32 array,
+    padded with -1, and scores are stored as int16 hundredths, which is exact because every
+    score is rounded to 2 decimals.
+
+    When the graph changes, the rows of the games whose neighbours may have changed are marked
+    stale; lookup refuses to answer for them until refresh recomputes them in place.
+
+    Instance Attributes:
+        - k: the number of neighbours stored for every game
+
+    Private Instance Attributes:
+        - _names: the game names, indexed by row
+        - _rows: map each game name to its row
+        - _neighbours: the rows of the neighbours of every game, best first
+        - _scores: the similarity score of every neighbour, times 100
+        - _stale: the games whose row is out of date with the graph, including the games that
+          have no row yet
+
+    Representation Invariants:
+        - self._neighbours.shape == self._scores.shape == (len(self._names), self.k)
+        - all(self._rows[self._names[i]] == i for i in range(len(self._names)))
+
+    >>> import project_total
+    >>> g = project_total.GameRecommendationGraph()
+    >>> for item, kind in [('ann', 'user'), ('bob', 'user'), ('cat', 'user'),
+    ...                    ('Portal', 'game'), ('Portal 2', 'game'), ('Doom', 'game'),
+    ...                    ('Tetris', 'game')]:
+    ...     g.add_vertex(item, kind, '')
+    >>> for user, game in [('ann', 'Portal'), ('ann', 'Doom'), ('bob', 'Portal'),
+    ...                    ('bob', 'Portal 2'), ('cat', 'Doom'), ('cat', 'Portal 2'),
+    ...                    ('cat', 'Tetris')]:
+    ...     g.add_edge(user, game, 1)
+    >>> index = NeighbourIndex.build(g, k=3)
+    >>> g.attach_neighbour_index(index)
+    >>> index.lookup('Portal', 3) == g.top_similar('Portal', 3)
+    True
+    >>> g.add_edge('ann', 'Tetris', 1)
+    >>> index.lookup('Portal', 3) is None
+    True
+    >>> g.refresh_neighbour_index()
+    4
+    >>> index.lookup('Portal', 3) == g.top_similar('Portal', 3)
+    True
+    >>> index.lookup('Portal', 3)
+    [('Tetris', 0.5), ('Portal 2', 0.5), ('Doom', 0.5)]
+    """
+    k: int
+    _names: list[str]
+    _rows: dict[str, int]
+    _neighbours: np.ndarray
+    _scores: np.ndarray
+    _stale: set
+
+    def __init__(self, names: list[str], neighbours: np.ndarray, scores: np.ndarray) -> None:
+        """Initialize an index from its arrays.
+
+        Use NeighbourIndex.build or NeighbourIndex.load to create an index.
+        """
+        self.k = neighbours.shape[1]
+        self._names = names
+        self._rows = {name: i for i, name in enumerate(names)}
+        self._neighbours = neighbours
+        self._scores = scores
+        self._stale = set()
+
+    @classmethod
+    def build(cls, graph: Any, k: int = 10) -> NeighbourIndex:
+        """Return the index of the k most similar games of every game in the given graph.
+
+        graph may be a GameRecommendationGraph or a SparseRecommendationGraph; a dict-based
+        graph is copied into a sparse graph first so that every game is scored with a single
+        sparse product.
+
+        Preconditions:
+            - k >= 1
+        """
+        if not isinstance(graph, SparseRecommendationGraph):
+            graph = SparseRecommendationGraph.from_graph(graph)
+
+        names = sorted(graph.get_all_vertices(kind='game'), key=str)
+        rows = {name: i for i, name in enumerate(names)}
+        neighbours = np.full((len(names), k), -1, dtype=np.int32)
+        scores = np.zeros((len(names), k), dtype=np.int16)
+        for i, name in enumerate(names):
+            for j, (other, score) in enumerate(graph.top_similar(name, k)):
+                neighbours[i, j] = rows[other]
+                scores[i, j] = round(score * 100)
+
+        return cls(names, neighbours, scores)
+
+    @classmethod
+    def load(cls, path: str) -> NeighbourIndex:
+        """Return the index saved at the given path by NeighbourIndex.save.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['names'].tolist(), data['neighbours'], data['scores'])
+
+    def save(self, path: str) -> None:
+        """Save this index to the given path, in numpy's .npz format.
+
+        Preconditions:
+            - not self.is_stale()
+        """
+        with open(path, 'wb') as f:
+            np.savez(f, names=np.array(self._names, dtype=str),
+                     neighbours=self._neighbours, scores=self._scores)
+
+    def __contains__(self, game: Any) -> bool:
+        """Return whether the neighbours of the given game are stored in this index.
+        """
+        return game in self._rows
+
+    def lookup(self, game: Any, limit: int) -> Optional[list[tuple[str, float]]]:
+        """Return the (game, score) pairs of the limit games most similar to the given game,
+        best first, in the same order GameRecommendationGraph.recommend_games ranks them.
+
+        Return None if the index cannot answer the query: when the game is not in this index,
+        or when limit is larger than k.
+        """
+        if game not in self._rows or limit > self.k or game in self._stale:
+            return None
+        i = self._rows[game]
+        return [(self._names[j], s / 100)
+                for j, s in zip(self._neighbours[i, :limit].tolist(),
+                                self._scores[i, :limit].tolist()) if j != -1]
+
+    def mark_stale(self, games: Any) -> None:
+        """Mark the rows of the given games as out of date with the graph.
+
+        A game that has no row yet gets one at the next refresh.
+        """
+        self._stale.update(games)
+
+    def is_stale(self) -> bool:
+        """Return whether any row of this index is out of date with the graph.
+        """
+        return len(self._stale) > 0
+
+    def refresh(self, graph: Any) -> int:
+        """Recompute the stale rows of this index from the given graph, in place, and return
+        how many rows were recomputed.
+
+        graph may be a GameRecommendationGraph or a SparseRecommendationGraph, and must be the
+        graph this index was built from, with all the changes marked since.
+        """
+        stale = [game for game in self._stale if graph.get_kind(game) == 'game']
+        new = sorted((game for game in stale if game not in self._rows), key=str)
+        if new:
+            self._rows.update((game, len(self._names) + i) for i, game in enumerate(new))
+            self._names.extend(new)
+            padding = np.full((len(new), self.k), -1, dtype=np.int32)
+            self._neighbours = np.concatenate([self._neighbours, padding])
+            self._scores = np.concatenate([self._scores, np.zeros_like(padding, np.int16)])
+        elif stale and not self._neighbours.flags.writeable:
+            # the arrays may be read-only views of a loaded file
+            self._neighbours = self._neighbours.copy()
+            self._scores = self._scores.copy()
+
+        for game in stale:
+            i = self._rows[game]
+            self._neighbours[i] = -1
+            self._scores[i] = 0
+            for j, (other, score) in enumerate(graph.top_similar(game, self.k)):
+                self._neighbours[i, j] = self._rows[other]
+                self._scores[i, j] = round(score * 100)
+
+        self._stale = set()
+        return len(stale)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'sparse_graph'],
+        'allowed-io': ['NeighbourIndex.save'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -1,29 +1,34 @@
 import json
+from instrumentation import stage
 
 
 def open_user_review(file_name) -> list[dict]:
     with open(file_name, encoding="utf-8") as f:
-        s = f.read()
-        s = s.replace('\'', '\"')
-        s = s.replace('True', '\"True\"')
-        s = s.replace('False', '\"False\"')
-        data = s.split("\n")
+        with stage('read'):
+            s = f.read()
+        with stage('replace_quotes'):
+            s = s.replace('\'', '\"')
+            s = s.replace('True', '\"True\"')
+            s = s.replace('False', '\"False\"')
+        with stage('split_lines'):
+            data = s.split("\n")
         data_so_far = []
-        for x in data:
-            try:
-                s = x.split('\"reviews\": ')[1][:-2]
-                s = s.split('\"funny\": \"\", ')
-                h = ['{' + m for m in s[1:]]
-                reviews_so_far = []
-                for y in h:
-                    j = y.split(', \"review\":')[0] + '}'
-                    reviews_so_far.append(json.loads(j))
-                i = x.split(', \"reviews\":')[0] + '}'
-                user_data = json.loads(i)
-                user_data['reviews'] = reviews_so_far
-                data_so_far.append(user_data)
-            except (json.decoder.JSONDecodeError, IndexError):
-                pass
+        with stage('json_decode'):
+            for x in data:
+                try:
+                    s = x.split('\"reviews\": ')[1][:-2]
+                    s = s.split('\"funny\": \"\", ')
+                    h = ['{' + m for m in s[1:]]
+                    reviews_so_far = []
+                    for y in h:
+                        j = y.split(', \"review\":')[0] + '}'
+                        reviews_so_far.append(json.loads(j))
+                    i = x.split(', \"reviews\":')[0] + '}'
+                    user_data = json.loads(i)
+                    user_data['reviews'] = reviews_so_far
+                    data_so_far.append(user_data)
+                except (json.decoder.JSONDecodeError, IndexError):
+                    pass
 
         return data_so_far
 
@@ -35,30 +40,35 @@ def filter_the_reviews_data(file_name='json/example_user_reviews.json') -> dict:
     """
     single_data = {}
     data = open_user_review(file_name)
-    for item in data:
-        single_data[item['user_id']] = ([{x['item_id']: x['recommend']} for x in item['reviews']],
-                                        item['user_url'])
+    with stage('filter'):
+        for item in data:
+            single_data[item['user_id']] = ([{x['item_id']: x['recommend']}
+                                             for x in item['reviews']], item['user_url'])
 
     return single_data
 
 
 def open_steam_games(file_name='json/steam_games.json') -> list[dict]:
     with open(file_name, encoding="utf-8") as f:
-        s = f.read()
-        s = s.replace('u\'', '\"')
-        s = s.replace('\'', '\"')
-        s = s.replace('True', '\"True\"')
-        s = s.replace('False', '\"False\"')
-        data = s.split("\n")
+        with stage('read'):
+            s = f.read()
+        with stage('replace_quotes'):
+            s = s.replace('u\'', '\"')
+            s = s.replace('\'', '\"')
+            s = s.replace('True', '\"True\"')
+            s = s.replace('False', '\"False\"')
+        with stage('split_lines'):
+            data = s.split("\n")
         data_so_far = []
 
-        for x in data:
-            try:
-                data_so_far.append(json.loads(x))
-            except json.decoder.JSONDecodeError:
-                pass
-            else:
-                pass
+        with stage('json_decode'):
+            for x in data:
+                try:
+                    data_so_far.append(json.loads(x))
+                except json.decoder.JSONDecodeError:
+                    pass
+                else:
+                    pass
 
     return data_so_far
 
@@ -70,16 +80,17 @@ def filter_the_games_data(file_name='json/steam_games.json') -> dict:
     """
     dictionary = {}
     data = open_steam_games(file_name)
-    for item in data:
-        if 'id' in item:
-            if 'title' in item:
-                dictionary[item['id']] = (item['title'], item['url'])
-            elif 'app_name' in item:
-                dictionary[item['id']] = (item['app_name'], item['url'])
+    with stage('filter'):
+        for item in data:
+            if 'id' in item:
+                if 'title' in item:
+                    dictionary[item['id']] = (item['title'], item['url'])
+                elif 'app_name' in item:
+                    dictionary[item['id']] = (item['app_name'], item['url'])
+                else:
+                    dictionary[item['id']] = ('N/A', item['url'])
             else:
-                dictionary[item['id']] = ('N/A', item['url'])
-        else:
-            pass
+                pass
     return dictionary
 
 
@@ -92,10 +103,11 @@ def filter_for_game_graph(file_name='json/steam_games.json') -> list:
     data = open_steam_games(file_name)
     for item in data:
         small_data = []
-        if 'app_name' in item:
-            small_data.append(item['app_name'])
-        elif 'title' in item:
+        # the same name as filter_the_games_data gives, so that rows match the graph's vertices
+        if 'title' in item:
             small_data.append(item['title'])
+        elif 'app_name' in item:
+            small_data.append(item['app_name'])
         else:
             small_data.append('N/A')
 
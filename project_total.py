@@ -2,12 +2,14 @@
 CSC111 Final Project: Recommendation for games and game friends
 """
 from __future__ import annotations
-from typing import Any, Union
+from typing import Any, Callable, Iterator, Optional, Sequence, Union
 import json
 import math
-import tkinter as tk
-import tkinter.messagebox
-import python_ta
+import os
+import sys
+from instrumentation import stage, timed, timed_iter
+from ranking import top_k_indices
+from result_cache import ResultCache
 
 
 ####################################################################################################
@@ -22,38 +24,56 @@ def open_user_review(file_name: str) -> list[dict]:
     Each element in the list is the review data from one user.
     And we drop some data with extremely messy strings.
     """
+    return list(iter_user_reviews(file_name))
+
+
+def iter_user_reviews(file_name: str) -> Iterator[dict]:
+    """
+    Read the data file 'australian_user_reviews.json' line by line.
+    Yield the review data from one user at a time, in the same format as open_user_review.
+    Only one line of the file is held in memory at a time, so the peak memory is bounded
+    by the largest user record and not by the size of the file.
+    """
     with open(file_name, encoding="utf-8") as f:
-        s = f.read()
-        # avoid JSONDecodeError when calling json.loads
-        s = s.replace('\'', '\"')
-        s = s.replace('True', '\"True\"')
-        s = s.replace('False', '\"False\"')
-        # using s.split("\n") to divide review data from each user
-        data = s.split("\n")
-        data_so_far = []
-        for x in data:
-            try:
-                # for each user, we drop their detailed comments to avoid JSONDecodeError.
-                # Since there are lots of messy strings in detailed comments.
-                s = x.split('\"reviews\": ')[1][:-2]
-                s = s.split('\"funny\": \"\", ')
-                h = ['{' + m for m in s[1:]]
-                reviews_so_far = []
-                for y in h:
-                    j = y.split(', \"review\":')[0] + '}'
-                    reviews_so_far.append(json.loads(j))
-                # reviews_so_far is a clean list of the user's reviews of games,
-                # in which we drop user's detailed comments.
-                i = x.split(', \"reviews\":')[0] + '}'
-                user_data = json.loads(i)
-                # i is the information of user's account.
-                user_data['reviews'] = reviews_so_far
-                data_so_far.append(user_data)
-            except (json.decoder.JSONDecodeError, IndexError):
-                # we drop the data with extremely messy strings to avoid JSONDecodeError
-                pass
+        # each line of the file holds the review data from one user; reading the file and
+        # splitting it into lines happen together, and are timed as the 'read' stage
+        for line in timed_iter('read', f):
+            user_data = parse_user_review_line(line.rstrip('\n'))
+            if user_data is not None:
+                yield user_data
 
-    return data_so_far
+
+def parse_user_review_line(x: str) -> Optional[dict]:
+    """
+    Parse one line of the data file 'australian_user_reviews.json'.
+    Return the review data from one user, or None if the line has extremely messy strings.
+    """
+    # avoid JSONDecodeError when calling json.loads
+    with stage('replace_quotes'):
+        x = x.replace('\'', '\"')
+        x = x.replace('True', '\"True\"')
+        x = x.replace('False', '\"False\"')
+    with stage('json_decode'):
+        try:
+            # for each user, we drop their detailed comments to avoid JSONDecodeError.
+            # Since there are lots of messy strings in detailed comments.
+            s = x.split('\"reviews\": ')[1][:-2]
+            s = s.split('\"funny\": \"\", ')
+            h = ['{' + m for m in s[1:]]
+            reviews_so_far = []
+            for y in h:
+                j = y.split(', \"review\":')[0] + '}'
+                reviews_so_far.append(json.loads(j))
+            # reviews_so_far is a clean list of the user's reviews of games,
+            # in which we drop user's detailed comments.
+            i = x.split(', \"reviews\":')[0] + '}'
+            user_data = json.loads(i)
+            # i is the information of user's account.
+            user_data['reviews'] = reviews_so_far
+            return user_data
+        except (json.decoder.JSONDecodeError, IndexError):
+            # we drop the data with extremely messy strings to avoid JSONDecodeError
+            return None
 
 
 def open_steam_games(file_name: str) -> list[dict]:
@@ -63,41 +83,61 @@ def open_steam_games(file_name: str) -> list[dict]:
     Each element in the list is the data of one game.
     And we drop some data with extremely messy strings.
     """
+    data_so_far = []
     with open(file_name, encoding="utf-8") as f:
-        s = f.read()
-        # avoid JSONDecodeError when calling json.loads
-        s = s.replace('u\'', '\"')
-        s = s.replace('\'', '\"')
-        s = s.replace('True', '\"True\"')
-        s = s.replace('False', '\"False\"')
-        # using s.split("\n") to divide data of each game
-        data = s.split("\n")
-        data_so_far = []
-
-        for x in data:
-            try:
-                data_so_far.append(json.loads(x))
-            except json.decoder.JSONDecodeError:
-                # we drop the data with extremely messy strings to avoid JSONDecodeError
-                pass
-            else:
-                pass
+        # each line of the file holds the data of one game
+        for line in timed_iter('read', f):
+            game_data = parse_steam_game_line(line.rstrip('\n'))
+            if game_data is not None:
+                data_so_far.append(game_data)
 
     return data_so_far
 
 
+def parse_steam_game_line(x: str) -> Optional[dict]:
+    """
+    Parse one line of the data file 'steam_games.json'.
+    Return the data of one game, or None if the line has extremely messy strings.
+    """
+    # avoid JSONDecodeError when calling json.loads
+    with stage('replace_quotes'):
+        x = x.replace('u\'', '\"')
+        x = x.replace('\'', '\"')
+        x = x.replace('True', '\"True\"')
+        x = x.replace('False', '\"False\"')
+    with stage('json_decode'):
+        try:
+            return json.loads(x)
+        except json.decoder.JSONDecodeError:
+            # we drop the data with extremely messy strings to avoid JSONDecodeError
+            return None
+
+
 def filter_the_reviews_data(file_name: str) -> dict:
     """the function that filter the reviews data
 
     this file format is {'user_id': ([{'item_id': 'recommend'},...], 'user_url')}
     """
-    single_data = {}
-    data = open_user_review(file_name)
-    for item in data:
-        single_data[item['user_id']] = ([{x['item_id']: x['recommend']} for x in item['reviews']],
-                                        item['user_url'])
+    return dict(iter_filtered_reviews(file_name))
+
 
-    return single_data
+def iter_filtered_reviews(file_name: str) -> Iterator[tuple[str, tuple[list[dict], str]]]:
+    """Yield the filtered reviews data one user at a time, while streaming the file.
+
+    Each item has the format ('user_id', ([{'item_id': 'recommend'},...], 'user_url')),
+    the same as one entry of filter_the_reviews_data.
+    """
+    for item in iter_user_reviews(file_name):
+        yield filter_user(item)
+
+
+@timed('filter')
+def filter_user(item: dict) -> tuple[str, tuple[list[dict], str]]:
+    """Return the ('user_id', ([{'item_id': 'recommend'},...], 'user_url')) entry of
+    the review data from one user.
+    """
+    return item['user_id'], ([{x['item_id']: x['recommend']} for x in item['reviews']],
+                             item['user_url'])
 
 
 def filter_the_games_data(file_name: str) -> dict:
@@ -109,17 +149,114 @@ def filter_the_games_data(file_name: str) -> dict:
     data = open_steam_games(file_name)
     for item in data:
         if 'id' in item:
-            if 'title' in item:
-                dictionary[item['id']] = (item['title'], item['url'])
-            elif 'app_name' in item:
-                dictionary[item['id']] = (item['app_name'], item['url'])
-            else:
-                dictionary[item['id']] = ('N/A', item['url'])
+            dictionary[item['id']] = _filter_game(item)
         else:
             pass
     return dictionary
 
 
+@timed('filter')
+def _filter_game(item: dict) -> tuple[str, str]:
+    """Return the ('app_name', 'url') entry of the data of one game.
+
+    Preconditions:
+        - 'id' in item
+    """
+    if 'title' in item:
+        return item['title'], item['url']
+    elif 'app_name' in item:
+        return item['app_name'], item['url']
+    else:
+        return 'N/A', item['url']
+
+
+def filter_the_reviews_data_parallel(file_name: str, workers: Optional[int] = None) -> dict:
+    """Return the same dictionary as filter_the_reviews_data, parsing the file in parallel.
+
+    The file is split into chunks that end on a line break, each chunk is parsed by a process
+    in a pool of the given number of workers (all cores by default), and the chunks are merged
+    in the order they appear in the file.
+    """
+    dictionary = {}
+    for chunk in _map_chunks(file_name, 'reviews', workers):
+        dictionary.update(chunk)
+    return dictionary
+
+
+def filter_the_games_data_parallel(file_name: str, workers: Optional[int] = None) -> dict:
+    """Return the same dictionary as filter_the_games_data, parsing the file in parallel.
+
+    The file is split into chunks that end on a line break, each chunk is parsed by a process
+    in a pool of the given number of workers (all cores by default), and the chunks are merged
+    in the order they appear in the file.
+    """
+    dictionary = {}
+    for chunk in _map_chunks(file_name, 'games', workers):
+        dictionary.update(chunk)
+    return dictionary
+
+
+def chunk_offsets(file_name: str, n: int) -> list[tuple[int, int]]:
+    """Split the given file into at most n chunks of about the same size, and return the
+    (start, end) byte offsets of every chunk.
+
+    Every chunk except the last one ends right after a line break, so no line is split.
+    """
+    size = os.path.getsize(file_name)
+    boundaries = [0]
+    with open(file_name, 'rb') as f:
+        for i in range(1, n):
+            f.seek(max(size * i // n, boundaries[-1]))
+            f.readline()
+            boundaries.append(min(f.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def _map_chunks(file_name: str, kind: str, workers: Optional[int]) -> Iterator[list[tuple]]:
+    """Parse the chunks of the given file in a process pool, and yield the filtered entries of
+    every chunk in the order they appear in the file.
+
+    Preconditions:
+        - kind in {'reviews', 'games'}
+    """
+    import concurrent.futures
+
+    workers = workers or os.cpu_count() or 1
+    # a few chunks per worker keeps the workers busy when some chunks are slower than others
+    offsets = chunk_offsets(file_name, workers * 4)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_filter_chunk, [file_name] * len(offsets), [kind] * len(offsets),
+                                [start for start, _ in offsets], [end for _, end in offsets])
+
+
+def _filter_chunk(file_name: str, kind: str, start: int, end: int) -> list[tuple]:
+    """Return the filtered entries of the lines between the given byte offsets of the file,
+    in the format of filter_the_reviews_data or filter_the_games_data depending on kind.
+
+    Preconditions:
+        - kind in {'reviews', 'games'}
+    """
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+    # the same line breaks as reading the file in text mode
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+
+    entries = []
+    if kind == 'reviews':
+        for line in lines:
+            item = parse_user_review_line(line)
+            if item is not None:
+                entries.append(filter_user(item))
+    else:
+        for line in lines:
+            item = parse_steam_game_line(line)
+            if item is not None and 'id' in item:
+                entries.append((item['id'], _filter_game(item)))
+    return entries
+
+
 ###################################################################################################
 # Part 2: Construct the Graph to store data about users, reviews, and games.
 # Using simularity scores to do recommendation for game friends and games.
@@ -136,21 +273,33 @@ class _ReviewVertex:
 
     Each vertex item is either a user id or game title. Both are represented as strings.
 
+    There is one vertex for every user and every game, so vertices use __slots__ instead of
+    an instance dictionary, and the url of a user is not stored when it follows the Steam
+    community pattern for their id.
+
     Instance Attributes:
         - item: The data stored in this vertex, representing a user or a game.
         - kind: The type of this vertex: 'user' or 'game'.
         - neighbours: The vertices that are adjacent to this vertex.
+        - sq_norm: The sum of the squared weights of the edges of this vertex, added up in the
+          order of self.neighbours.
+
+    Private Instance Attributes:
+        - _url: The url page of this vertex, or None if it is _template_url(item, kind).
 
     Representation Invariants:
         - self not in self.neighbours
         - all(self in u.neighbours for u in self.neighbours)
         - self.kind in {'user', 'game'}
+        - self.sq_norm == sum(w ** 2 for w in self.neighbours.values())
 
     """
+    __slots__ = ('item', 'kind', 'neighbours', 'sq_norm', '_url')
     item: Any
     kind: str
-    url: str
     neighbours: dict[_ReviewVertex, Union[int, float]]
+    sq_norm: Union[int, float]
+    _url: Optional[str]
 
     def __init__(self, item: Any, kind: str, url: str) -> None:
         """Initialize a new vertex with the given item and kind.
@@ -162,46 +311,130 @@ class _ReviewVertex:
         """
         self.item = item
         self.kind = kind
-        self.url = url
+        self._url = None if url == _template_url(item, kind) else url
         self.neighbours = {}
+        self.sq_norm = 0
+
+    @property
+    def url(self) -> str:
+        """The url page of one single game or one single user."""
+        return self._url if self._url is not None else _template_url(self.item, self.kind)
 
     def get_url(self) -> str:
         """get the url page of one single game or one single user
         """
         return self.url
 
+    def set_weight(self, other: _ReviewVertex, weight: Union[int, float]) -> None:
+        """Set the weight of the edge from this vertex to other, and keep sq_norm up to date.
+
+        Only this side of the edge is changed.
+        """
+        if other in self.neighbours:
+            self.neighbours[other] = weight
+            # added up again rather than adjusted, so that float weights do not drift
+            self.sq_norm = sum(w ** 2 for w in self.neighbours.values())
+        else:
+            self.neighbours[other] = weight
+            self.sq_norm += weight ** 2
+
     def get_consice_similarity(self, other: _ReviewVertex) -> float:
         """the function that can help to get the consice similarity of two users.
 
+        This gives the same score as consice_similarity on the rating lists of the two
+        vertices, but only the neighbours they share are visited, by walking the smaller of
+        the two neighbour dicts, and the squared norms come from sq_norm. With float weights,
+        the sums may be added up in a different order, which can change the last bit of a
+        score before it is rounded; integer weights always give exactly the same score.
         """
-        user1 = []
-        user2 = []
-        for item in self.neighbours:
-            if item in other.neighbours:
-                user1.append(self.neighbours[item])
-                user2.append(other.neighbours[item])
-            else:
-                user1.append(self.neighbours[item])
-                user2.append('N/A')
+        if len(other.neighbours) < len(self.neighbours):
+            small, large = other.neighbours, self.neighbours
+        else:
+            small, large = self.neighbours, other.neighbours
+        above = 0
+        for item, weight in small.items():
+            if item in large:
+                above += weight * large[item]
+        return _similarity(above, self.sq_norm, other.sq_norm)
+
+
+# the url pages of Steam users, by whether their id is a numeric profile id or a custom id
+_PROFILE_URL = 'http://steamcommunity.com/profiles/'
+_CUSTOM_URL = 'http://steamcommunity.com/id/'
 
-        for item in other.neighbours:
-            if item not in self.neighbours:
-                user1.append('N/A')
-                user2.append(other.neighbours[item])
 
-        return consice_similarity(user1, user2)
+def _template_url(item: Any, kind: str) -> Optional[str]:
+    """Return the url page that Steam gives the vertex with the given item and kind, or None if
+    it cannot be told from the item alone.
+
+    Game urls hold the app id, which is not part of the game title, so they are never derived.
+
+    >>> _template_url('76561197970982479', 'user')
+    'http://steamcommunity.com/profiles/76561197970982479'
+    >>> _template_url('js41637', 'user')
+    'http://steamcommunity.com/id/js41637'
+    >>> _template_url('Portal 2', 'game') is None
+    True
+    """
+    if kind != 'user' or not isinstance(item, str):
+        return None
+    return (_PROFILE_URL if item.isdigit() else _CUSTOM_URL) + item
 
 
 class GameRecommendationGraph:
     """A graph that used to represent a game review networks and contains the ratings to each games.
 
+    Private Instance Attributes:
+        - _vertices: map each item to the vertex storing it
+        - _neighbour_index: a precomputed NeighbourIndex that recommend_games answers from,
+          or None. Adding an edge marks the rows it changes as stale, and
+          refresh_neighbour_index recomputes them.
+        - _expanded_games: the games whose whole two-hop neighbourhood has been marked stale
+          in _neighbour_index since it was last refreshed
+        - _lsh_index: a MinHashLSH index that find_similar_player draws its candidates from
+          when asked for an approximate answer, or None. It is dropped as soon as an edge is
+          added, since it would be out of date.
+        - _tag_index: a TagIndex over the game catalog that recommend_games blends into its
+          scores when asked to, or None. It does not depend on the reviews, so it is kept
+          when edges are added.
+        - _embeddings: trained Embeddings of the users and games that find_similar_player and
+          recommend_games rank by when asked to, or None. They are trained offline, so they
+          are kept when edges are added, until they are retrained and attached again.
+        - _random_walk: a RandomWalkIndex that find_similar_player and recommend_games rank by
+          personalized PageRank with when asked to, or None. It is dropped as soon as an edge
+          is added, since it would be out of date.
+        - _title_index: a TitleIndex over the game titles that resolve_game and suggest_games
+          look names up in, or None. New games are added to it as they are added to the graph.
+        - _sparse_mirror: a SparseRecommendationGraph copy of this graph that the exact
+          similarity queries are scored from, or None. It is built on the first such query,
+          and every vertex or edge added after that is added to it too.
+        - _result_cache: the cached results of recent queries. Adding a vertex or an edge
+          drops the results it may have changed.
     """
     _vertices: dict[Any, _ReviewVertex]
+    _neighbour_index: Optional[Any]
+    _expanded_games: set
+    _lsh_index: Optional[Any]
+    _tag_index: Optional[Any]
+    _embeddings: Optional[Any]
+    _random_walk: Optional[Any]
+    _title_index: Optional[Any]
+    _sparse_mirror: Optional[Any]
+    _result_cache: ResultCache
 
     def __init__(self) -> None:
         """Initialize a new empty game recommendation graph.
         """
         self._vertices = {}
+        self._neighbour_index = None
+        self._expanded_games = set()
+        self._lsh_index = None
+        self._tag_index = None
+        self._embeddings = None
+        self._random_walk = None
+        self._title_index = None
+        self._sparse_mirror = None
+        self._result_cache = ResultCache()
 
     def add_vertex(self, item: Any, kind: str, url: str) -> None:
         """Add a new vertex in this graph.
@@ -210,7 +443,16 @@ class GameRecommendationGraph:
             - kind in {'user', 'game'}
         """
         if item not in self._vertices:
+            if isinstance(item, str):
+                # the same id or title is read again for every review that mentions it
+                item = sys.intern(item)
             self._vertices[item] = _ReviewVertex(item, kind, url)
+            if kind == 'game' and self._title_index is not None:
+                self._title_index.add(item)
+            if self._sparse_mirror is not None:
+                self._sparse_mirror.add_vertex(item, kind, url)
+            # a query on this item may have been answered with 'out of range'
+            self._result_cache.invalidate([item])
 
     def add_edge(self, item1: Any, item2: Any, weight: Union[int, float]) -> None:
         """Add an edge between the two vertices with the given items in this graph,
@@ -225,8 +467,15 @@ class GameRecommendationGraph:
             v1 = self._vertices[item1]
             v2 = self._vertices[item2]
 
-            v1.neighbours[v2] = weight
-            v2.neighbours[v1] = weight
+            v1.set_weight(v2, weight)
+            v2.set_weight(v1, weight)
+            if self._neighbour_index is not None:
+                self._mark_index_stale(v1, v2)
+            self._lsh_index = None
+            self._random_walk = None
+            if self._sparse_mirror is not None and v1.kind != v2.kind:
+                self._sparse_mirror.add_edge(item1, item2, weight)
+            self._invalidate_around(v1, v2)
         else:
             raise ValueError
 
@@ -266,90 +515,535 @@ class GameRecommendationGraph:
         else:
             return set(self._vertices.keys())
 
+    def get_kind(self, item: Any) -> str:
+        """Return the kind of the vertex with the given item: 'user' or 'game'.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        return self._vertices[item].kind
+
+    def get_url(self, item: Any) -> str:
+        """Return the url page of the vertex with the given item.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        return self._vertices[item].get_url()
+
+    def get_neighbours(self, item: Any) -> dict[Any, Union[int, float]]:
+        """Return a dictionary mapping each neighbour item of the given item to the
+        weight of the edge between them.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        return {v.item: weight for v, weight in self._vertices[item].neighbours.items()}
+
     ################################################################################################
     # the following codes are our main body of the graph
     ################################################################################################
 
+    def configure_cache(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        """Replace the result cache of this graph with an empty one of the given size, whose
+        entries expire after ttl seconds (or never, if ttl is None).
+
+        A maxsize of 0 turns caching off.
+        """
+        self._result_cache = ResultCache(maxsize, ttl)
+
+    def cache_info(self) -> dict[str, Any]:
+        """Return the hits, misses, current size, maximum size and time to live of the result
+        cache of this graph.
+
+        Adding an edge only drops the results it may have changed:
+
+        >>> g = GameRecommendationGraph()
+        >>> for item, kind in [('ann', 'user'), ('bob', 'user'), ('cat', 'user'),
+        ...                    ('dan', 'user'), ('Portal', 'game'), ('Doom', 'game'),
+        ...                    ('Tetris', 'game')]:
+        ...     g.add_vertex(item, kind, 'http://example.com/' + item)
+        >>> for user, game in [('ann', 'Portal'), ('bob', 'Portal'), ('cat', 'Doom'),
+        ...                    ('dan', 'Tetris')]:
+        ...     g.add_edge(user, game, 1)
+        >>> g.find_similar_player('ann', 5)
+        [('bob', 'http://example.com/bob')]
+        >>> g.recommend_games('Tetris', 5)
+        'No recommended games'
+        >>> g.add_edge('cat', 'Portal', 1)
+        >>> g.find_similar_player('ann', 5)
+        [('bob', 'http://example.com/bob'), ('cat', 'http://example.com/cat')]
+        >>> g.recommend_games('Tetris', 5)
+        'No recommended games'
+        >>> g.cache_info()['hits'], g.cache_info()['misses']
+        (1, 3)
+        """
+        cache = self._result_cache
+        return {'hits': cache.hits, 'misses': cache.misses, 'size': len(cache),
+                'maxsize': cache.maxsize, 'ttl': cache.ttl}
+
+    def _invalidate_around(self, v1: _ReviewVertex, v2: _ReviewVertex) -> None:
+        """Drop the cached results that a new edge between v1 and v2 may have changed.
+
+        The edge changes the norms of v1 and v2, so it changes their scores with every vertex
+        that shares a neighbour with one of them. The results of queries on v1, v2 and those
+        vertices are dropped; every other score stays the same.
+
+        The entries are found through the items they involve, so this takes time in proportion
+        to the vertices two edges away from v1 and v2, not to the size of the cache.
+        """
+        if len(self._result_cache) == 0:
+            return
+        self._result_cache.invalidate(
+            [v1.item, v2.item] + [v.item for middle in (*v1.neighbours, *v2.neighbours)
+                                  for v in middle.neighbours])
+
+    def _cached(self, key: tuple, involved: tuple, compute: Callable[[], Any]) -> Any:
+        """Return the cached result of the query with the given key, or compute and cache it.
+
+        involved are the items the query is about. Lists are copied in and out of the cache,
+        so callers cannot change a cached result.
+        """
+        result = self._result_cache.get(key)
+        if result is None:
+            result = compute()
+            self._result_cache.put(key, list(result) if isinstance(result, list) else result,
+                                   involved)
+            return result
+        return list(result) if isinstance(result, list) else result
+
+    def attach_neighbour_index(self, index: Any) -> None:
+        """Let recommend_games answer from the given NeighbourIndex, built from this graph.
+
+        Adding an edge marks the rows of the index it changes as stale; recommend_games scans
+        the graph for those games until refresh_neighbour_index is called.
+        """
+        self._neighbour_index = index
+        self._expanded_games = set()
+
+    def refresh_neighbour_index(self) -> int:
+        """Recompute the stale rows of the attached NeighbourIndex in place, and return how
+        many rows were recomputed.
+        """
+        if self._neighbour_index is None:
+            return 0
+        self._expanded_games = set()
+        return self._neighbour_index.refresh(self)
+
+    def _mark_index_stale(self, v1: _ReviewVertex, v2: _ReviewVertex) -> None:
+        """Mark the rows of the neighbour index that a new edge between v1 and v2 changes.
+
+        The edge changes the norm of its game, and so its score with every game that shares a
+        user with it: the game's two-hop neighbourhood. A game that already had its two-hop
+        neighbourhood marked since the last refresh only gains the games of the new user.
+        """
+        for game, user in ((v1, v2), (v2, v1)):
+            if game.kind == 'game':
+                stale = {h.item for h in user.neighbours}
+                if game.item not in self._expanded_games:
+                    self._expanded_games.add(game.item)
+                    stale.update(h.item for u in game.neighbours for h in u.neighbours)
+                self._neighbour_index.mark_stale(stale)
+
+    def attach_lsh_index(self, index: Any) -> None:
+        """Let find_similar_player(..., approximate=True) draw its candidates from the given
+        MinHashLSH index, built from this graph.
+
+        The index is dropped the next time an edge is added to this graph.
+        """
+        self._lsh_index = index
+        self._result_cache.clear()
+
+    def attach_tag_index(self, index: Any) -> None:
+        """Let recommend_games(..., tag_weight=...) blend in the tag similarities of the given
+        TagIndex, and recommend games that have no reviews.
+        """
+        self._tag_index = index
+        self._result_cache.clear()
+
+    def attach_embeddings(self, embeddings: Any) -> None:
+        """Let find_similar_player(..., embedding=True) and recommend_games(..., embedding=True)
+        rank by the given Embeddings, trained from this graph.
+        """
+        self._embeddings = embeddings
+        self._result_cache.clear()
+
+    def attach_random_walk(self, index: Any) -> None:
+        """Let find_similar_player(..., random_walk=True) and
+        recommend_games(..., random_walk=True) rank by the personalized PageRank of the given
+        RandomWalkIndex, built from this graph.
+
+        The index is dropped the next time an edge is added to this graph.
+        """
+        self._random_walk = index
+        self._result_cache.clear()
+
+    def attach_title_index(self, index: Any) -> None:
+        """Let resolve_game and suggest_games look game names up in the given TitleIndex,
+        built from the game titles of this graph.
+        """
+        self._title_index = index
+
+    def resolve_game(self, name: str) -> Optional[str]:
+        """Return the game title in this graph that the given name refers to, or None.
+
+        Without a TitleIndex, only the exact title is found. With one, the name may also
+        differ from the title in capitalization.
+        """
+        if name in self._vertices and self._vertices[name].kind == 'game':
+            return name
+        elif self._title_index is not None:
+            return self._title_index.resolve(name)
+        else:
+            return None
+
+    def suggest_games(self, query: str, limit: int = 10) -> list[str]:
+        """Return at most limit game titles for the given query, as typed so far: the titles
+        that start with it, ignoring capitalization, then the titles most similar to it.
+
+        Return [] if no TitleIndex is attached.
+        """
+        if self._title_index is None:
+            return []
+        return self._title_index.suggest(query, limit)
+
     def get_two_items_similarity_score(self, item1: Any, item2: Any) -> float:
         """get the similarity score of two items.
 
         test for this function: self.get_two_items_similarity_score('DJKamBer', '76561198077246154')
         """
         if item1 in self._vertices and item2 in self._vertices:
-            return self._vertices[item1].get_consice_similarity(self._vertices[item2])
+            return self._cached(('score', item1, item2), (item1, item2),
+                                lambda: self._score(item1, item2))
         else:
             raise ValueError
 
-    def find_similar_player(self, player: Any, limit: int) -> Any:
+    def _score(self, item1: Any, item2: Any) -> float:
+        """Return the similarity score of two items, without going through the result cache.
+
+        Preconditions:
+            - item1 in self._vertices and item2 in self._vertices
+        """
+        return self._vertices[item1].get_consice_similarity(self._vertices[item2])
+
+    def find_similar_player(self, player: Any, limit: int, approximate: bool = False,
+                            probe_bands: Optional[int] = None, embedding: bool = False,
+                            random_walk: bool = False) -> Any:
         """find players that has similar ratings to the given player
 
+        If approximate is True and a MinHashLSH index is attached, only the players that share
+        an LSH bucket with the given player are scored, in the first probe_bands bands of the
+        index (all of them by default). Probing fewer bands is faster but finds fewer of the
+        truly most similar players.
+
+        If embedding is True and Embeddings that cover the given player are attached, the
+        players are ranked by the cosine of their embeddings instead, which takes precedence
+        over approximate.
+
+        If random_walk is True and a RandomWalkIndex is attached, the players are ranked by
+        their personalized PageRank for a walk that restarts at the given player instead,
+        which takes precedence over approximate but not over embedding.
+
         Preconditions:
             - player in self._vertices
             - self._vertices[player].kind == 'user'
             - limit >= 1
 
+        """
+        if embedding and self._embeddings is not None and player in self._embeddings:
+            key = ('find_similar_player', player, limit, 'embedding', id(self._embeddings))
+            return self._cached(key, (player,), lambda: self._rank_by(
+                self._embeddings, player, limit, 'No recommended friends'))
+        if random_walk and self._random_walk is not None and player in self._random_walk:
+            key = ('find_similar_player', player, limit, 'random_walk', id(self._random_walk))
+            return self._cached(key, (player,), lambda: self._rank_by(
+                self._random_walk, player, limit, 'No recommended friends'))
+        if approximate and self._lsh_index is not None:
+            # the same query has a different answer once the index is replaced or dropped
+            key = ('find_similar_player', player, limit, id(self._lsh_index), probe_bands)
+        else:
+            key = ('find_similar_player', player, limit)
+        return self._cached(key, (player,), lambda: self._find_similar_player(
+            player, limit, approximate, probe_bands))
+
+    def _find_similar_player(self, player: Any, limit: int, approximate: bool,
+                             probe_bands: Optional[int]) -> Any:
+        """Return the result of find_similar_player, without going through the result cache.
         """
         if player not in self._vertices:
             return 'out of range'
 
-        users = self.get_all_vertices(kind='user')
-        users_score = [(x, self.get_two_items_similarity_score(x, player))
-                       for x in users if x != player]
-
-        s1 = sorted(users_score, key=lambda x: x[0], reverse=True)
-        s2 = sorted(s1, key=lambda x: x[1], reverse=True)
-        result_so_far = []
-        for i in range(0, limit):
-            if s2[i][1] == 0:
-                pass
-            else:
-                result_so_far.append(s2[i][0])
+        if approximate and self._lsh_index is not None:
+            with stage('score'):
+                ranked = self._lsh_index.top_similar(player, limit, probe_bands)
+            result_so_far = [x for x, _ in ranked]
+        else:
+            result_so_far = [x for x, _ in self._top_similar(player, 'user', limit)]
 
         if len(result_so_far) == 0:
             return 'No recommended friends'
         else:
-            return [(user, self._vertices[users].get_url()) for user in result_so_far]
+            return [(user, self._vertices[user].get_url()) for user in result_so_far]
 
-    def recommend_games(self, game: str, limit: int) -> Union[list[tuple[str, str]], str]:
+    def recommend_games(self, game: str, limit: int, tag_weight: float = 0.0,
+                        embedding: bool = False,
+                        random_walk: bool = False) -> Union[list[tuple[str, str]], str]:
         """this function can help to recommend the games that satisfies your favorite.
 
+        If tag_weight > 0 and a TagIndex is attached, the games are ranked by a blend of the
+        review-based score and the tag similarity instead: (1 - tag_weight) times the first
+        plus tag_weight times the second. In that mode, a game in the tag index that nobody
+        has reviewed yet can be asked about and recommended too.
+
+        If embedding is True and Embeddings that cover the given game are attached, the games
+        are ranked by the cosine of their embeddings instead, which takes precedence over
+        tag_weight.
+
+        If random_walk is True and a RandomWalkIndex is attached, the games are ranked by
+        their personalized PageRank for a walk that restarts at the given game instead, which
+        takes precedence over tag_weight but not over embedding.
+
         Preconditions:
             - game in self._vertices
             - self._vertices[game].kind == 'game'
             - limit >= 1
+            - 0 <= tag_weight <= 1
 
         """
-        if game not in self._vertices:
+        if embedding and self._embeddings is not None and game in self._embeddings:
+            key = ('recommend_games', game, limit, 'embedding', id(self._embeddings))
+            return self._cached(key, (game,), lambda: self._rank_by(
+                self._embeddings, game, limit, 'No recommended games'))
+        if random_walk and self._random_walk is not None and game in self._random_walk:
+            key = ('recommend_games', game, limit, 'random_walk', id(self._random_walk))
+            return self._cached(key, (game,), lambda: self._rank_by(
+                self._random_walk, game, limit, 'No recommended games'))
+        if tag_weight > 0 and self._tag_index is not None:
+            return self._cached(('recommend_games', game, limit, tag_weight), (game,),
+                                lambda: self._recommend_hybrid(game, limit, tag_weight))
+        return self._cached(('recommend_games', game, limit), (game,),
+                            lambda: self._recommend_games(game, limit))
+
+    def recommend_games_for_user(self, user: Any,
+                                 limit: int) -> Union[list[tuple[str, str]], str]:
+        """Recommend at most limit games that the given user has not rated yet, based on the
+        games they rated.
+
+        The score of a game is the sum, over every game the user rated, of the rating times
+        the consice similarity of the two games, rounded to 2 decimals. All the scores come
+        from one sparse matrix product on the SparseRecommendationGraph copy of this graph.
+
+        Return 'out of range' if user is not in this graph, and 'No recommended games' if no
+        unrated game has a positive score.
+
+        Preconditions:
+            - limit >= 1
+
+        Doom is similar to Portal, but ann has rated both, so neither is in ann's results:
+
+        >>> g = GameRecommendationGraph()
+        >>> for item, kind in [('ann', 'user'), ('bob', 'user'), ('cat', 'user'),
+        ...                    ('Portal', 'game'), ('Portal 2', 'game'), ('Doom', 'game'),
+        ...                    ('Tetris', 'game')]:
+        ...     g.add_vertex(item, kind, '')
+        >>> for user, game in [('ann', 'Portal'), ('ann', 'Doom'), ('bob', 'Portal'),
+        ...                    ('bob', 'Portal 2'), ('cat', 'Doom'), ('cat', 'Portal 2'),
+        ...                    ('cat', 'Tetris')]:
+        ...     g.add_edge(user, game, 1)
+        >>> [game for game, _ in g.recommend_games('Portal', 10)]
+        ['Portal 2', 'Doom']
+        >>> [game for game, _ in g.recommend_games_for_user('ann', 10)]
+        ['Portal 2', 'Tetris']
+        >>> g.recommend_games_for_user('dan', 10)
+        'out of range'
+        """
+        if user not in self._vertices:
             return 'out of range'
+        # the scores change with the similarities of the rated games, as well as with the user
+        involved = (user,) + tuple(game.item for game in self._vertices[user].neighbours)
+        return self._cached(('recommend_games_for_user', user, limit), involved,
+                            lambda: self._recommend_games_for_user(user, limit))
 
-        games = self.get_all_vertices(kind='game')
-        games_scores = [(x, self.get_two_items_similarity_score(x, game))
-                        for x in games if x != game]
+    def _recommend_games_for_user(self, user: Any,
+                                  limit: int) -> Union[list[tuple[str, str]], str]:
+        """Return the result of recommend_games_for_user, without going through the result
+        cache.
 
-        s1 = sorted(games_scores, key=lambda x: x[0], reverse=True)
-        s2 = sorted(s1, key=lambda x: x[1], reverse=True)
+        Preconditions:
+            - user in self._vertices
+        """
+        query = self._vertices[user]
+        if query.kind != 'user':
+            return 'No recommended games'
 
-        recommend_so_far = []
-        for i in range(0, limit):
-            if s2[i][1] == 0:
-                pass
-            else:
-                recommend_so_far.append(s2[i][0])
+        mirror = self._mirror()
+        with stage('score'):
+            ranked = mirror.top_games_for_user(user, limit)
+
+        if len(ranked) == 0:
+            return 'No recommended games'
+        return [(game_id, self._vertices[game_id].url) for game_id, _ in ranked]
+
+    def _rank_by(self, ranker: Any, item: Any, limit: int,
+                 empty: str) -> Union[list[tuple[str, str]], str]:
+        """Return the (item, url) pairs of the limit items of the same kind that the given
+        ranker, the attached Embeddings or RandomWalkIndex, ranks the highest for the given
+        item, or empty if it ranks none, without going through the result cache.
+
+        Preconditions:
+            - item in ranker
+        """
+        with stage('score'):
+            ranked = ranker.top_similar(item, limit)
+        if len(ranked) == 0:
+            return empty
+        return [(other, self._vertices[other].url) for other, _ in ranked]
+
+    def _recommend_hybrid(self, game: str, limit: int,
+                          tag_weight: float) -> Union[list[tuple[str, str]], str]:
+        """Return the result of recommend_games blended with the attached TagIndex, without
+        going through the result cache.
+        """
+        if game in self._vertices and self._vertices[game].kind == 'game':
+            review_scores = self._review_scores(game)
+        elif game in self._tag_index:
+            review_scores = {}
+        else:
+            return 'out of range'
+
+        recommend_so_far = self._tag_index.blend(game, review_scores, tag_weight, limit)
+        if len(recommend_so_far) == 0:
+            return 'No recommended games'
+        return [(game_id, self._vertices[game_id].url if game_id in self._vertices
+                 else self._tag_index.get_url(game_id)) for game_id, _ in recommend_so_far]
+
+    def _review_scores(self, game: str) -> dict[str, float]:
+        """Return the nonzero review-based similarity scores between the given game and the
+        other games, the same scores _score gives.
+
+        Only the games that share a user with the given game can have a nonzero score, so they
+        are the only ones scored.
+        """
+        query = self._vertices[game]
+        above = {}
+        with stage('score'):
+            for middle, weight in query.neighbours.items():
+                if weight != 0:
+                    for v, other_weight in middle.neighbours.items():
+                        if other_weight != 0 and v is not query:
+                            above[v] = above.get(v, 0) + other_weight * weight
+            scores = {v.item: _similarity(above[v], v.sq_norm, query.sq_norm) for v in above}
+        return {item: score for item, score in scores.items() if score != 0}
+
+    def _recommend_games(self, game: str, limit: int) -> Union[list[tuple[str, str]], str]:
+        """Return the result of recommend_games, without going through the result cache.
+        """
+        if game not in self._vertices:
+            return 'out of range'
+
+        if self._neighbour_index is not None:
+            # answer in O(limit) from the precomputed index, if it covers this query
+            indexed = self._neighbour_index.lookup(game, limit)
+            if indexed is not None:
+                if len(indexed) == 0:
+                    return 'No recommended games'
+                return [(game_id, self._vertices[game_id].url) for game_id, _ in indexed]
+
+        recommend_so_far = [x for x, _ in self._top_similar(game, 'game', limit)]
 
         if len(recommend_so_far) == 0:
             return 'No recommended games'
         else:
             return [(game_id, self._vertices[game_id].url) for game_id in recommend_so_far]
 
+    def top_similar(self, item: Any, limit: int) -> list[tuple[Any, float]]:
+        """Return the (item, score) pairs of the limit vertices with the highest positive
+        similarity score to the given item, best first.
+
+        Ties are ordered by score descending, then by item descending. This never uses the
+        result cache or the neighbour index.
+
+        Preconditions:
+            - item in self._vertices
+        """
+        return self._top_similar(item, self._vertices[item].kind, limit)
+
+    def _top_similar(self, item: Any, kind: str, limit: int) -> list[tuple[Any, float]]:
+        """Return the (item, score) pairs of the limit vertices of the given kind with the
+        highest nonzero similarity scores to item, best first, exactly as scoring every vertex
+        of that kind one pair at a time and taking the top limit would rank them.
+
+        All the scores come from one sparse matrix-vector product on the
+        SparseRecommendationGraph copy of this graph. Scores below 0, which only ratings below
+        0 give, rank after every vertex with a score of 0, so they are only returned when there
+        are too few of those to fill the top limit.
+        """
+        if self._vertices[item].kind != kind:
+            # a user and a game never share a neighbour, so every score is 0
+            return []
+        mirror = self._mirror()
+        with stage('score'):
+            scores = mirror.similarity_scores(item)
+        items = mirror.get_vertex_table(kind)[0]
+
+        with stage('sort'):
+            ranked = _top_scores(scores, scores > 0, items, limit)
+            # every vertex but item itself that is not scored above or below 0
+            zeros = len(scores) - 1 - len(scores.nonzero()[0])
+            if len(ranked) + zeros < limit:
+                ranked += _top_scores(scores, scores < 0, items, limit - len(ranked) - zeros)
+        return ranked
+
+    def _mirror(self) -> Any:
+        """Return the SparseRecommendationGraph copy of this graph, building it first if it
+        has not been built yet.
+        """
+        if self._sparse_mirror is None:
+            from sparse_graph import SparseRecommendationGraph
+            self._sparse_mirror = SparseRecommendationGraph.from_graph(self)
+        return self._sparse_mirror
+
+
+def _top_scores(scores: Any, keep: Any, items: list, limit: int) -> list[tuple[Any, float]]:
+    """Return the (item, score) pairs of the limit highest of the given scores at the positions
+    where keep is True, best first, with ties ordered by item descending.
+
+    scores and keep are numpy arrays indexed the same way as items.
+    """
+    candidates = keep.nonzero()[0]
+    best = top_k_indices(scores[candidates], [items[j] for j in candidates.tolist()], limit)
+    return [(items[candidates[b]], float(scores[candidates[b]])) for b in best]
+
+
+def _similarity(above: Union[int, float], sq_norm1: Union[int, float],
+                sq_norm2: Union[int, float]) -> float:
+    """Return the consice similarity of two vectors given their dot product and squared norms,
+    computed and rounded exactly the way consice_similarity does.
+    """
+    below = math.sqrt(sq_norm1) * math.sqrt(sq_norm2)
+    if above == 0 or below == 0:
+        return 0
+    else:
+        return round(above / below, 2)
+
 
 ####################################################################################################
 # the following functions are given to prepare the environment for the above graph
 ####################################################################################################
 
 
-def load_weighted_graph(reviews_file: str, game_names_file: str) -> GameRecommendationGraph:
+def load_weighted_graph(reviews_file: str, game_names_file: str, streaming: bool = False,
+                        workers: int = 1) -> GameRecommendationGraph:
     """Return a game recommendation WEIGHTED graph corresponding to the given datasets.
 
+    If streaming is True, the reviews file is read one user at a time and each user is added
+    to the graph as soon as it is parsed, so the reviews file is never held in memory. In that
+    mode, a user id that appears on several lines keeps the reviews from all of them, instead
+    of only the reviews from the last one.
+
+    If workers > 1, both files are parsed in parallel by a pool of that many processes
+    instead, and streaming is ignored. The graph is the same as with workers == 1.
+
     try the following code to test this function:
     load_weighted_graph('json/example_user_reviews.json', 'steam_games.json')
     load_weighted_graph('australian_user_reviews.json', 'steam_games.json')
@@ -357,26 +1051,45 @@ def load_weighted_graph(reviews_file: str, game_names_file: str) -> GameRecommen
     format of game_files: {'id': ('app_name', 'url')}
     format of user_files: {'user_id': ([{'item_id': 'recommend'},...], 'user_url')}
     """
-    user_files = filter_the_reviews_data(reviews_file)
-    game_files = filter_the_games_data(game_names_file)
+    if workers > 1:
+        game_files = filter_the_games_data_parallel(game_names_file, workers)
+        user_files = filter_the_reviews_data_parallel(reviews_file, workers).items()
+    elif streaming:
+        game_files = filter_the_games_data(game_names_file)
+        user_files = iter_filtered_reviews(reviews_file)
+    else:
+        game_files = filter_the_games_data(game_names_file)
+        user_files = filter_the_reviews_data(reviews_file).items()
 
     graph = GameRecommendationGraph()
 
-    for user_id in user_files:
-        graph.add_vertex(item=user_id, kind='user', url=user_files[user_id][1])
-
-        for review in user_files[user_id][0]:
-            key = list(review.keys())[0]
-            if key in game_files and review[key] == 'True':
-                graph.add_vertex(game_files[key][0], 'game', game_files[key][1])
-                graph.add_edge(user_id, game_files[key][0], weight=1)
-            if key in game_files and review[key] == 'False':
-                graph.add_vertex(game_files[key][0], 'game', game_files[key][1])
-                graph.add_edge(user_id, game_files[key][0], weight=0)
+    for user_id, (reviews, user_url) in user_files:
+        add_user_reviews(graph, user_id, reviews, user_url, game_files)
 
     return graph
 
 
+@timed('insert')
+def add_user_reviews(graph: GameRecommendationGraph, user_id: str, reviews: list[dict],
+                     user_url: str, game_files: dict) -> None:
+    """Add one user and the games they reviewed to the given graph.
+
+    reviews and user_url are one entry of filter_the_reviews_data, and game_files is the
+    dictionary returned by filter_the_games_data. Reviews of games that are not in game_files
+    are skipped.
+    """
+    graph.add_vertex(item=user_id, kind='user', url=user_url)
+
+    for review in reviews:
+        key = list(review.keys())[0]
+        if key in game_files and review[key] == 'True':
+            graph.add_vertex(game_files[key][0], 'game', game_files[key][1])
+            graph.add_edge(user_id, game_files[key][0], weight=1)
+        if key in game_files and review[key] == 'False':
+            graph.add_vertex(game_files[key][0], 'game', game_files[key][1])
+            graph.add_edge(user_id, game_files[key][0], weight=0)
+
+
 def consice_similarity(user1: list, user2: list) -> float:
     """
     compute the consice similarity of two users.
@@ -418,12 +1131,14 @@ def recommend(method: str, input_id: str, graph: GameRecommendationGraph) \
     Return a list of recommended games/game users together with their url.
 
     Precondition:
-        - method1 in {'user id', 'favorite game id'}
+        - method1 in {'user id', 'favorite game id', 'user id games'}
     """
     if method == 'user id':
         return recommend_user_id(input_id, graph)
     elif method == 'favorite game id':
         return recommend_game_id(input_id, graph)
+    elif method == 'user id games':
+        return recommend_games_for_user_id(input_id, graph)
     else:
         raise ValueError
 
@@ -433,14 +1148,30 @@ def print_result(method: str, input_id: str, graph: GameRecommendationGraph) ->
     Using the certain method to recommend games/game friends with the input id/app name.
     Show a messagebox including recommended games together with their url.
     Precondition:
-        - method2 in {'user id', 'favorite game id'}
+        - method2 in {'user id', 'favorite game id', 'user id games'}
     """
-    recommended_games = recommend(method, input_id, graph)
+    result = recommend(method, input_id, graph)
+    if result == 'out of range' and method == 'favorite game id':
+        show_result(result, graph.suggest_games(input_id, 5))
+    else:
+        show_result(result)
+
+
+def show_result(recommended_games: Union[list[tuple[str, str]], str],
+                suggestions: Sequence[str] = ()) -> None:
+    """Show a messagebox including the given result of recommend.
+
+    If the input id was out of range, the given suggestions of what may have been meant are
+    shown as well.
+    """
+    import tkinter.messagebox
+
     if recommended_games == 'out of range':
         error_message = 'Sorry, the input id is not in our library. ' \
-                        'We are very sorry we can"t make recommendation for this id.' \
-                        '(Please be sure entering letter capitalization correctly. ' \
-                        'The identification of game names is strict.'
+                        'We are very sorry we can"t make recommendation for this id.'
+        if suggestions:
+            error_message += '\n\nDid you mean: ' + ', '.join(suggestions) + '? ' \
+                             '(Game names may be typed in any capitalization.)'
         tkinter.messagebox.showwarning(title='Recommendation Games/Friends',
                                        message=error_message)
     elif recommended_games == 'No recommended games':
@@ -448,6 +1179,11 @@ def print_result(method: str, input_id: str, graph: GameRecommendationGraph) ->
                         'related to your favorite game.'
         tkinter.messagebox.showinfo(title='Recommendation Games/Friends',
                                     message=error_message)
+    elif recommended_games == 'No recommended friends':
+        error_message = 'We are very sorry that there is no recommended game friend ' \
+                        'for this user.'
+        tkinter.messagebox.showinfo(title='Recommendation Games/Friends',
+                                    message=error_message)
     else:
         message_so_far = ''
         for game in recommended_games:
@@ -467,23 +1203,47 @@ def recommend_user_id(user_id: str, graph: GameRecommendationGraph) \
 def recommend_game_id(game_name: str, graph: GameRecommendationGraph) \
         -> Union[list[tuple[str, str]], str]:
     """
-    Recommend at most 10 games to users with their favorite game name.
+    Recommend at most 10 games to users with their favorite game name, which may differ
+    from the title in capitalization if the graph has a title index.
+    Return a list of recommended games together with their url.
+    """
+    return graph.recommend_games(graph.resolve_game(game_name) or game_name, 10)
+
+
+def recommend_games_for_user_id(user_id: str, graph: GameRecommendationGraph) \
+        -> Union[list[tuple[str, str]], str]:
+    """
+    Recommend at most 10 games that a user with a certain user_id has not reviewed yet.
     Return a list of recommended games together with their url.
     """
-    return graph.recommend_games(game_name, 10)
+    return graph.recommend_games_for_user(user_id, 10)
 
 
-def recommend_interface(graph: GameRecommendationGraph) -> None:
+def recommend_interface(graph: Optional[GameRecommendationGraph] = None,
+                        load: Optional[Callable[[], GameRecommendationGraph]] = None) -> None:
     """
     Construct an interface for users to make games recommendations based on a
     certain game id or a certain user id. User can choose the method of recommendation freely
-    (with a game id or a user id). And after entering the id number, users can press the
-    'Recommend!' button to get their unique game recommendation list.
+    (game friends or games for a user id, or games for a game id). And after entering the id
+    number, users can press the 'Recommend!' button to get their unique game recommendation
+    list. While a favorite game name is typed, the matching game titles are suggested below
+    the entry box, if the graph has a title index.
+
+    If graph is None, the window opens right away and the graph is loaded by calling load
+    (load_recommendation_graph by default) in the background. Loading the graph and every
+    recommendation run on a worker thread, so the window never freezes: a progress bar moves
+    while they run, and the 'Cancel' button abandons them. The results are handed back to the
+    window by polling with after(). If loading the graph fails, the error is shown, and the
+    window offers to retry loading or to close.
     """
+    import tkinter as tk
+    import tkinter.messagebox
+    import tkinter.ttk
+
     # initialize the interface window
     window = tk.Tk()
     window.title('Games and Friends Recommendation')
-    window.geometry('500x300')
+    window.geometry('500x420')
     tk.Label(window, text='Welcome', font=('Arial', 16)).pack()
 
     # Use Radiobutton for users to choose the way to do recommendation
@@ -495,32 +1255,222 @@ def recommend_interface(graph: GameRecommendationGraph) -> None:
     r2 = tk.Radiobutton(window, text='favorite game name (recommend games)',
                         variable=method, value='favorite game id')
     r2.pack()
+    r3 = tk.Radiobutton(window, text='user id (recommend games)',
+                        variable=method, value='user id games')
+    r3.pack()
 
     # Construct the entry box for users to enter id number
     id_entry = tk.Entry(window, show=None, font=('Arial', 14))
     id_entry.pack()
 
+    # Suggest game titles below the entry box while a favorite game name is typed
+    suggestion_box = tk.Listbox(window, height=4, font=('Arial', 10))
+    suggestion_box.pack(fill='x', padx=40)
+
+    def on_key(_: Any) -> None:
+        """Show the game titles that match what has been typed so far."""
+        suggestion_box.delete(0, tk.END)
+        if state['graph'] is not None and method.get() == 'favorite game id' \
+                and id_entry.get().strip():
+            for title in state['graph'].suggest_games(id_entry.get(), 8):
+                suggestion_box.insert(tk.END, title)
+
+    def on_pick(_: Any) -> None:
+        """Put the picked game title in the entry box."""
+        picked = suggestion_box.curselection()
+        if picked:
+            id_entry.delete(0, tk.END)
+            id_entry.insert(0, suggestion_box.get(picked[0]))
+
+    id_entry.bind('<KeyRelease>', on_key)
+    suggestion_box.bind('<<ListboxSelect>>', on_pick)
+
+    runner = _TaskRunner()
+    state = {'graph': graph, 'task': None, 'query': None}
+    status = tk.StringVar()
+    progress = tkinter.ttk.Progressbar(window, mode='indeterminate', length=300)
+
+    def start(task: Callable[[], Any], kind: str, message: str) -> None:
+        """Run task on the worker thread, and show that it is running."""
+        runner.submit(task)
+        state['task'] = kind
+        status.set(message)
+        db.config(state='disabled')
+        cancel_button.config(text='Cancel', state='normal')
+        progress.start(10)
+
+    def stop(message: str) -> None:
+        """Show that no task is running."""
+        state['task'] = None
+        status.set(message)
+        progress.stop()
+        if state['graph'] is not None:
+            db.config(text='Recommend!', command=on_recommend, state='normal')
+            cancel_button.config(state='disabled')
+        else:
+            # the graph failed to load, so only loading it again or leaving is left to do
+            db.config(text='Retry loading', command=on_load, state='normal')
+            cancel_button.config(text='Close', state='normal')
+
+    def on_load() -> None:
+        """Start loading the graph."""
+        start(load or load_recommendation_graph, 'load', 'Loading the game library...')
+
+    def on_recommend() -> None:
+        """Start a recommendation for the chosen method and the entered id."""
+        chosen_method, input_id, loaded = method.get(), id_entry.get(), state['graph']
+        state['query'] = (chosen_method, input_id)
+        start(lambda: recommend(chosen_method, input_id, loaded), 'query',
+              'Finding recommendations...')
+
+    def on_cancel() -> None:
+        """Abandon the running task, or close the window if there is no graph."""
+        runner.cancel()
+        if state['graph'] is None:
+            window.destroy()
+        else:
+            stop('Cancelled.')
+
+    def poll() -> None:
+        """Hand the result of the running task, if it is done, back to the window."""
+        done = runner.poll()
+        if done is not None:
+            result, error = done
+            if error is not None:
+                stop('Could not load the game library.' if state['task'] == 'load'
+                     else 'Something went wrong.')
+                tkinter.messagebox.showerror(title='Recommendation Games/Friends',
+                                             message=str(error))
+            elif state['task'] == 'load':
+                state['graph'] = result
+                stop('Ready.')
+            else:
+                stop('Ready.')
+                chosen_method, input_id = state['query']
+                if result == 'out of range' and chosen_method == 'favorite game id':
+                    show_result(result, state['graph'].suggest_games(input_id, 5))
+                else:
+                    show_result(result)
+        window.after(50, poll)
+
     # Construct the start button 'Recommend!' for users to start recommendation
-    db = tk.Button(window, text="Recommend!",
-                   command=(lambda: print_result(method.get(), id_entry.get(), graph)))
+    db = tk.Button(window, text="Recommend!", command=on_recommend)
     db.pack()
+    cancel_button = tk.Button(window, text='Cancel', command=on_cancel, state='disabled')
+    cancel_button.pack()
+    progress.pack(pady=5)
+    tk.Label(window, textvariable=status).pack()
+
+    if graph is None:
+        on_load()
+    else:
+        stop('Ready.')
+    window.after(50, poll)
 
     window.mainloop()
 
 
+class _TaskRunner:
+    """Run tasks one at a time on a background thread, and hand their results back to the
+    thread that polls for them.
+
+    Only the result of the last submitted task is handed back; the results of cancelled or
+    replaced tasks are dropped. A task that is already running cannot be interrupted, so a
+    cancelled task still runs to the end before the next one starts.
+
+    Private Instance Attributes:
+        - _tasks: the submitted tasks, with their ids, waiting for the worker thread
+        - _results: the (id, result, error) of every finished task
+        - _current: the id of the task whose result is wanted, or None
+        - _next_id: the id of the next submitted task
+    """
+    _tasks: Any
+    _results: Any
+    _current: Optional[int]
+    _next_id: int
+
+    def __init__(self) -> None:
+        """Initialize a runner with no tasks, and start its worker thread.
+        """
+        import queue
+        import threading
+
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._current = None
+        self._next_id = 0
+        threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, task: Callable[[], Any]) -> None:
+        """Run task after the tasks submitted before it, and drop their results.
+        """
+        self._current = self._next_id
+        self._next_id += 1
+        self._tasks.put((self._current, task))
+
+    def cancel(self) -> None:
+        """Drop the result of the last submitted task.
+        """
+        self._current = None
+
+    def poll(self) -> Optional[tuple[Any, Optional[Exception]]]:
+        """Return the (result, error) of the last submitted task if it is done, or None.
+
+        error is the exception the task raised, or None if it returned result.
+        """
+        while not self._results.empty():
+            task_id, result, error = self._results.get()
+            if task_id == self._current:
+                self._current = None
+                return result, error
+        return None
+
+    def _work(self) -> None:
+        """Run the submitted tasks forever, on the worker thread.
+        """
+        while True:
+            task_id, task = self._tasks.get()
+            try:
+                self._results.put((task_id, task(), None))
+            except Exception as error:  # handed back to the window to report
+                self._results.put((task_id, None, error))
+
+
 ####################################################################################################
 # Part 4: load data sets and call functions to do recommendation
 ####################################################################################################
 
 
-recommendation_graph = load_weighted_graph('australian_user_reviews.json', 'steam_games.json')
-recommend_interface(recommendation_graph)
+def load_recommendation_graph(reviews_file: str = 'australian_user_reviews.json',
+                              game_names_file: str = 'steam_games.json',
+                              cache_dir: str = '.graph_cache') -> GameRecommendationGraph:
+    """Return the game recommendation graph of the given datasets.
+
+    The graph is rebuilt from the datasets only when they changed since the last snapshot
+    saved in cache_dir, and comes with a TitleIndex over its games. Nothing is read until
+    this function is called, so importing this module has no side effects.
+    """
+    import snapshot
+    from title_index import TitleIndex
+
+    graph = snapshot.load_cached_graph(reviews_file, game_names_file, cache_dir,
+                                       load_weighted_graph, GameRecommendationGraph)
+    graph.attach_title_index(TitleIndex(graph.get_all_vertices(kind='game')))
+    return graph
+
 
-python_ta.check_all(config={
-    'extra-imports': ['json', 'math', 'tkinter', 'tkinter.messagebox'],
-    # the names (strs) of imported modules
-    'allowed-io': ['open_steam_games', 'open_user_review'],
-    # the names (strs) of functions that call print/open/input
-    'max-line-length': 100,
-    'disable': ['E1136']
-})
+if __name__ == '__main__':
+    recommend_interface()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['concurrent.futures', 'json', 'math', 'os', 'queue', 'sys',
+                          'threading', 'tkinter', 'tkinter.messagebox', 'tkinter.ttk',
+                          'instrumentation', 'ranking', 'result_cache', 'snapshot',
+                          'sparse_graph', 'title_index'],
+        # the names (strs) of imported modules
+        'allowed-io': ['open_steam_games', 'iter_user_reviews', 'chunk_offsets', '_filter_chunk'],
+        # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
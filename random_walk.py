@@ -0,0 +1,226 @@
+"""
+CSC111 Final Project: Personalized PageRank over the user-game review graph
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import numpy as np
+from ranking import top_k_indices
+from sparse_graph import SparseRecommendationGraph
+
+
+class RandomWalkIndex:
+    """The transition matrix of a random walk with restart over the users and games of a
+    recommendation graph, for ranking by personalized PageRank.
+
+    A walk started at a seed item follows a review at every step with probability
+    1 - restart, choosing among the reviews of its current item in proportion to their
+    ratings, and jumps back to the seed with probability restart. The score of an item is the
+    probability of finding the walk there in the long run. Unlike the consice similarity,
+    which only counts neighbours two hops away, this also reaches users and games that are
+    four, six or more hops from the seed, which matters most for users with few reviews.
+
+    Users and games share one node numbering: the users first, then the games. The weighted
+    adjacency matrix is symmetric and stored once, in compressed sparse row form.
+
+    Instance Attributes:
+        - restart: the probability that the walk jumps back to the seed at every step
+        - push_epsilon: if not None, top_similar approximates the scores by forward push
+          with this residual threshold instead of running power iteration
+        - push_budget: the number of edges forward push may visit in one query before
+          top_similar gives up on it and runs power iteration instead
+
+    Private Instance Attributes:
+        - _items: the item of every node
+        - _nodes: map each item to its node
+        - _n_users: the number of user nodes, which come before the game nodes
+        - _indptr, _indices, _data: the weighted adjacency matrix in compressed sparse row form
+        - _rows: the row of every stored entry of the adjacency matrix
+        - _degrees: the weighted degree of every node
+
+    Representation Invariants:
+        - 0 < self.restart < 1
+        - self.push_epsilon is None or self.push_epsilon > 0
+        - self.push_budget >= 0
+        - len(self._items) == len(self._nodes) == len(self._degrees)
+    """
+    restart: float
+    push_epsilon: Optional[float]
+    push_budget: int
+    _items: list
+    _nodes: dict[Any, int]
+    _n_users: int
+    _indptr: np.ndarray
+    _indices: np.ndarray
+    _data: np.ndarray
+    _rows: np.ndarray
+    _degrees: np.ndarray
+
+    def __init__(self, graph: Any, restart: float = 0.15,
+                 push_epsilon: Optional[float] = None,
+                 push_budget: Optional[int] = None) -> None:
+        """Build the index of the given GameRecommendationGraph or SparseRecommendationGraph.
+
+        Ratings of 0 are edges of weight 0, which the walk never follows.
+
+        Forward push visits at most about 1 / (restart * push_epsilon) edges, so it only pays
+        off when push_epsilon is above 1 / (restart * edges), where edges counts both
+        directions of every review; below that, it may visit more edges than the graph has.
+        Its ranking is rough: on benchmark.generate_dataset(directory, 5000, 5000), with 29,328
+        edges, push_epsilon=1e-3 answers in 0.4 ms against 23 ms for power iteration, but only
+        60% of its top 10 score as high as the 10th best by power iteration.
+
+        push_budget caps the edges a query may visit, a quarter of the edges by default. A
+        query over budget runs power iteration instead, so it costs at most about 1.4 times as
+        much as power iteration alone (32 ms on the graph above, with push_epsilon=1e-7).
+
+        Preconditions:
+            - 0 < restart < 1
+            - push_epsilon is None or push_epsilon > 0
+            - push_budget is None or push_budget >= 0
+        """
+        if not isinstance(graph, SparseRecommendationGraph):
+            graph = SparseRecommendationGraph.from_graph(graph)
+        users, games = graph.get_vertex_table('user')[0], graph.get_vertex_table('game')[0]
+        row_indptr, row_indices, row_data = graph.get_csr()
+        col_indptr, col_indices, col_data = graph.get_csc()
+
+        self.restart = restart
+        self.push_epsilon = push_epsilon
+        self._items = list(users) + list(games)
+        self._nodes = {item: i for i, item in enumerate(self._items)}
+        self._n_users = len(users)
+        # the user rows point at game nodes, and the game rows at user nodes
+        self._indptr = np.concatenate([row_indptr[:-1].astype(np.int64),
+                                       col_indptr.astype(np.int64) + int(row_indptr[-1])])
+        self._indices = np.concatenate([row_indices.astype(np.int64) + len(users),
+                                        col_indices.astype(np.int64)])
+        self._data = np.concatenate([row_data, col_data]).astype(np.float64)
+        self._rows = np.repeat(np.arange(len(self._items)), np.diff(self._indptr))
+        self._degrees = np.bincount(self._rows, weights=self._data, minlength=len(self._items))
+        self.push_budget = len(self._data) // 4 if push_budget is None else push_budget
+
+    def __contains__(self, item: Any) -> bool:
+        """Return whether the given user or game is in this index.
+        """
+        return item in self._nodes
+
+    def scores(self, item: Any, tolerance: float = 1e-6,
+               max_iterations: int = 100) -> np.ndarray:
+        """Return the personalized PageRank of every node for a walk seeded at the given item,
+        as an array indexed by node.
+
+        Power iteration stops once an iteration changes the scores by less than tolerance in
+        total, or after max_iterations iterations. Every iteration is one pass over the
+        stored entries. The walk jumps back to the seed from items without a positive rating,
+        so the scores always sum to 1.
+
+        Preconditions:
+            - item in self
+            - tolerance > 0
+            - max_iterations >= 1
+        """
+        seed = self._nodes[item]
+        dangling = self._degrees == 0
+        inverse_degrees = np.divide(1, self._degrees, out=np.zeros_like(self._degrees),
+                                    where=~dangling)
+        scores = np.zeros(len(self._items))
+        scores[seed] = 1.0
+        for _ in range(max_iterations):
+            spread = scores * inverse_degrees
+            updated = (1 - self.restart) * np.bincount(
+                self._rows, weights=self._data * spread[self._indices],
+                minlength=len(self._items))
+            updated[seed] += self.restart + (1 - self.restart) * scores[dangling].sum()
+            change = np.abs(updated - scores).sum()
+            scores = updated
+            if change < tolerance:
+                break
+        return scores
+
+    def push_scores(self, item: Any, epsilon: float,
+                    budget: Optional[int] = None) -> Optional[dict[int, float]]:
+        """Return an approximation of the personalized PageRank of the nodes near the given
+        item, by forward push (Andersen, Chung and Lang, 2006), mapping each node reached to
+        its score. Return None instead if pushing would visit more than budget edges.
+
+        Every node keeps the probability mass that has reached it but not yet moved on; a
+        node whose mass exceeds epsilon times its degree keeps restart of it and pushes the
+        rest to its neighbours. The score of every node is then underestimated by at most
+        epsilon times its degree, and the work done is proportional to the edges of the nodes
+        pushed, at most about 1 / (restart * epsilon), not to the size of the graph.
+
+        Preconditions:
+            - item in self
+            - epsilon > 0
+            - budget is None or budget >= 0
+        """
+        seed = self._nodes[item]
+        if self._degrees[seed] == 0:
+            return {seed: 1.0}
+
+        estimates, residuals = {}, {seed: 1.0}
+        queue, queued = [seed], {seed}
+        visited = 0
+        while queue:
+            node = queue.pop()
+            start, end = self._indptr[node], self._indptr[node + 1]
+            visited += end - start
+            if budget is not None and visited > budget:
+                return None
+            queued.discard(node)
+            mass = residuals.pop(node)
+            estimates[node] = estimates.get(node, 0.0) + self.restart * mass
+            share = (1 - self.restart) * mass / self._degrees[node]
+            for neighbour, weight in zip(self._indices[start:end].tolist(),
+                                         self._data[start:end].tolist()):
+                if weight != 0:
+                    residual = residuals.get(neighbour, 0.0) + share * weight
+                    residuals[neighbour] = residual
+                    if neighbour not in queued and residual > epsilon * self._degrees[neighbour]:
+                        queue.append(neighbour)
+                        queued.add(neighbour)
+        return estimates
+
+    def top_similar(self, item: Any, limit: int) -> list[tuple[Any, float]]:
+        """Return the (item, score) pairs of the limit items of the same kind as the given item
+        with the highest positive personalized PageRank for a walk seeded at it, best first,
+        with ties ordered by item descending.
+
+        The scores are approximated by forward push if push_epsilon is set and the push stays
+        within push_budget edges, and computed by power iteration otherwise.
+
+        Preconditions:
+            - item in self
+        """
+        seed = self._nodes[item]
+        if seed < self._n_users:
+            low, high = 0, self._n_users
+        else:
+            low, high = self._n_users, len(self._items)
+
+        estimates = None
+        if self.push_epsilon is not None:
+            estimates = self.push_scores(item, self.push_epsilon, self.push_budget)
+        if estimates is None:
+            scores = self.scores(item)
+            candidates = np.arange(low, high)
+            candidate_scores = scores[low:high]
+        else:
+            candidates = np.array([node for node in estimates if low <= node < high],
+                                  dtype=np.int64)
+            candidate_scores = np.array([estimates[node] for node in candidates.tolist()])
+
+        keep = (candidate_scores > 0) & (candidates != seed)
+        candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+        best = top_k_indices(candidate_scores, [self._items[j] for j in candidates.tolist()],
+                             limit)
+        return [(self._items[candidates[b]], float(candidate_scores[b])) for b in best]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'ranking', 'sparse_graph'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
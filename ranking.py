@@ -0,0 +1,56 @@
+"""
+CSC111 Final Project: Top-k selection of recommendation candidates
+"""
+from __future__ import annotations
+from typing import Any, Iterable, Sequence
+import heapq
+
+
+def top_k(scored_items: Iterable[tuple[Any, float]], k: int) -> list[tuple[Any, float]]:
+    """Return the k (item, score) pairs with the highest scores, best first.
+
+    Ties are ordered the same way as sorting by item descending and then by score descending
+    would order them, i.e. by score descending and then by item descending. Return all the
+    pairs if there are fewer than k of them. This takes O(n log k) time for n pairs.
+
+    >>> top_k([('a', 0.5), ('c', 0.2), ('b', 0.5), ('d', 0.9)], 3)
+    [('d', 0.9), ('b', 0.5), ('a', 0.5)]
+    >>> top_k([('a', 0.5)], 10)
+    [('a', 0.5)]
+    """
+    return heapq.nlargest(k, scored_items, key=lambda pair: (pair[1], pair[0]))
+
+
+def top_k_indices(scores: Any, items: Sequence, k: int) -> list[int]:
+    """Return the indices of the k highest scores, best first.
+
+    scores is a numpy array and items[i] is the item that scores[i] belongs to. Ties are broken
+    by item descending, the same way as top_k. argpartition narrows the scores down to the ones
+    that can make the top k before any item is compared, so numpy itself is not imported here.
+
+    >>> import numpy as np
+    >>> top_k_indices(np.array([0.5, 0.2, 0.5, 0.9]), ['a', 'c', 'b', 'd'], 3)
+    [3, 2, 0]
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return []
+    if k < n:
+        threshold = scores[scores.argpartition(n - k)[n - k]]
+        candidates = (scores >= threshold).nonzero()[0].tolist()
+    else:
+        candidates = range(n)
+
+    return heapq.nlargest(k, candidates, key=lambda i: (scores[i], items[i]))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['heapq'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,84 @@
+"""
+CSC111 Final Project: Command line entry point for game and friend recommendations
+
+Usage:
+    python recommend.py --user USER_ID
+    python recommend.py --game "GAME NAME"
+    python recommend.py            (opens the recommendation window)
+"""
+from __future__ import annotations
+from typing import Optional
+import argparse
+import sys
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Return the parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(prog='recommend',
+                                     description='Recommend game friends or games.')
+    query = parser.add_mutually_exclusive_group()
+    query.add_argument('--user', metavar='ID', help='recommend game friends for this user id')
+    query.add_argument('--game', metavar='NAME', help='recommend games similar to this game')
+    parser.add_argument('--limit', type=int, default=10,
+                        help='the maximum number of recommendations (default: 10)')
+    parser.add_argument('--reviews', default='australian_user_reviews.json',
+                        help='the user reviews dataset')
+    parser.add_argument('--games', default='steam_games.json', help='the steam games dataset')
+    parser.add_argument('--cache', default='.graph_cache',
+                        help='the directory of the graph snapshot')
+    parser.add_argument('--index', metavar='PATH',
+                        help='answer --game queries from the neighbour index saved at PATH, '
+                             'building it first if PATH does not exist')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the recommendation asked for on the command line, and return the exit status.
+
+    Without --user or --game, open the recommendation window instead.
+    """
+    args = parse_args(argv)
+
+    # the datasets are only loaded once we know there is something to recommend
+    import project_total
+
+    def load() -> project_total.GameRecommendationGraph:
+        """Return the graph of the datasets given on the command line."""
+        return project_total.load_recommendation_graph(args.reviews, args.games, args.cache)
+
+    if args.user is None and args.game is None:
+        # the window opens right away and loads the graph in the background
+        project_total.recommend_interface(load=load)
+        return 0
+
+    graph = load()
+
+    if args.index is not None and args.game is not None:
+        import os
+        from neighbour_index import NeighbourIndex
+        if not os.path.exists(args.index):
+            NeighbourIndex.build(graph, max(args.limit, 10)).save(args.index)
+        graph.attach_neighbour_index(NeighbourIndex.load(args.index))
+
+    if args.user is not None:
+        result = graph.find_similar_player(args.user, args.limit)
+    else:
+        result = graph.recommend_games(graph.resolve_game(args.game) or args.game, args.limit)
+
+    if result == 'out of range':
+        print('Sorry, the input id is not in our library.', file=sys.stderr)
+        suggestions = graph.suggest_games(args.game, 5) if args.game is not None else []
+        if suggestions:
+            print('Did you mean: ' + ', '.join(suggestions) + '?', file=sys.stderr)
+        return 1
+    elif isinstance(result, str):
+        print(result)
+    else:
+        for item, url in result:
+            print('ID: ' + item + ', URL: ' + url)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""
+CSC111 Final Project: HTTP/JSON recommendation service
+
+Usage:
+    python recommend_server.py --port 8000
+
+    GET /recommend?method=user+id&id=USER_ID
+    GET /recommend?method=favorite+game+id&id=GAME+NAME
+    GET /recommend?method=user+id+games&id=USER_ID
+    GET /suggest?q=PARTIAL+GAME+NAME
+    GET /health
+    GET /metrics
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import argparse
+import asyncio
+import bisect
+import concurrent.futures
+import json
+import sys
+import time
+import urllib.parse
+import project_total
+
+# the upper bounds, in milliseconds, of the buckets of the request latency histogram
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# how long a client may take to send its request line and headers, in seconds
+REQUEST_TIMEOUT = 10
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            408: 'Request Timeout', 500: 'Internal Server Error'}
+
+
+class LatencyHistogram:
+    """A histogram of request latencies, with fixed buckets.
+
+    Instance Attributes:
+        - bounds: the upper bound of every bucket, in milliseconds, in increasing order
+        - counts: the number of latencies in every bucket; the last count is for the
+          latencies above every bound
+        - total: the number of latencies recorded
+        - total_ms: the sum of the latencies recorded, in milliseconds
+
+    Representation Invariants:
+        - len(self.counts) == len(self.bounds) + 1
+        - sum(self.counts) == self.total
+
+    >>> histogram = LatencyHistogram((1, 10))
+    >>> histogram.record(0.004)
+    >>> histogram.record(0.5)
+    >>> histogram.to_dict()['buckets']
+    {'le_1ms': 0, 'le_10ms': 1, 'inf': 1}
+    """
+    bounds: tuple
+    counts: list[int]
+    total: int
+    total_ms: float
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS) -> None:
+        """Initialize an empty histogram with the given bucket bounds, in milliseconds.
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.total_ms = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Record one latency of the given number of seconds.
+        """
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.total += 1
+        self.total_ms += ms
+
+    def to_dict(self) -> dict:
+        """Return this histogram as a JSON-serializable dictionary.
+        """
+        buckets = {'le_' + str(bound) + 'ms': count for bound, count in zip(self.bounds,
+                                                                           self.counts)}
+        buckets['inf'] = self.counts[-1]
+        mean = self.total_ms / self.total if self.total else 0.0
+        return {'count': self.total, 'mean_ms': round(mean, 3), 'buckets': buckets}
+
+
+class RecommendationServer:
+    """An HTTP server that answers recommend(method, input_id) queries as JSON.
+
+    The graph is loaded once and shared by every request. Queries run on a single worker
+    thread, so the event loop keeps accepting and answering other requests (such as health
+    checks) while a query is being scored, and the graph and its result cache are never used
+    by two queries at once.
+
+    Instance Attributes:
+        - graph: the game recommendation graph the queries are answered from
+        - latencies: the latencies of the /recommend requests answered so far
+
+    Private Instance Attributes:
+        - _executor: the thread the queries run on
+        - _started: the time.monotonic() time at which this server was created
+    """
+    graph: project_total.GameRecommendationGraph
+    latencies: LatencyHistogram
+    _executor: concurrent.futures.ThreadPoolExecutor
+    _started: float
+
+    def __init__(self, graph: project_total.GameRecommendationGraph) -> None:
+        """Initialize a server for the given graph.
+        """
+        self.graph = graph
+        self.latencies = LatencyHistogram()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._started = time.monotonic()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8000) -> None:
+        """Serve requests on the given host and port until cancelled.
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """Answer the one request sent on the given connection, then close it.
+        """
+        try:
+            try:
+                method, target = await asyncio.wait_for(_read_request(reader), REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                status, body = 408, {'error': 'request timeout'}
+            except ValueError:
+                status, body = 400, {'error': 'malformed request'}
+            else:
+                try:
+                    status, body = await self.respond(method, target)
+                except Exception:  # a failed query must not take the server down with it
+                    status, body = 500, {'error': 'internal error'}
+            await _write_response(writer, status, body)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method: str, target: str) -> tuple[int, dict]:
+        """Return the status code and the JSON body of the response to the given request.
+        """
+        url = urllib.parse.urlsplit(target)
+        if url.path not in {'/recommend', '/suggest', '/health', '/metrics'}:
+            return 404, {'error': 'unknown path ' + url.path}
+        if method != 'GET':
+            return 405, {'error': 'only GET is supported'}
+
+        if url.path == '/health':
+            uptime = time.monotonic() - self._started
+            return 200, {'status': 'ok', 'uptime_seconds': round(uptime, 1)}
+        elif url.path == '/metrics':
+            return 200, {'latency': self.latencies.to_dict(), 'cache': self.graph.cache_info()}
+
+        query = urllib.parse.parse_qs(url.query)
+        if url.path == '/suggest':
+            if 'q' not in query:
+                return 400, {'error': 'the q parameter is required'}
+            titles = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.graph.suggest_games, query['q'][0], 10)
+            return 200, {'results': titles}
+
+        if 'method' not in query or 'id' not in query:
+            return 400, {'error': 'the method and id parameters are required'}
+        start = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, project_total.recommend, query['method'][0], query['id'][0],
+                self.graph)
+        except ValueError:
+            return 400, {'error': "method must be 'user id', 'favorite game id' or "
+                                  "'user id games'"}
+        finally:
+            self.latencies.record(time.perf_counter() - start)
+        status, body = _result_body(result)
+        if result == 'out of range' and query['method'][0] == 'favorite game id':
+            body['suggestions'] = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.graph.suggest_games, query['id'][0], 5)
+        return status, body
+
+
+def _result_body(result: Any) -> tuple[int, dict]:
+    """Return the status code and the JSON body of the given result of recommend.
+    """
+    if result == 'out of range':
+        return 404, {'error': 'the input id is not in our library'}
+    elif isinstance(result, str):
+        return 200, {'results': [], 'message': result}
+    else:
+        return 200, {'results': [{'id': item, 'url': url} for item, url in result]}
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str]:
+    """Return the method and the target of the HTTP request sent by reader, and skip its
+    headers.
+
+    Raise a ValueError if the request line is malformed.
+    """
+    parts = (await reader.readline()).decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise ValueError
+    while (await reader.readline()) not in {b'\r\n', b'\n', b''}:
+        pass
+    return parts[0], parts[1]
+
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, body: dict) -> None:
+    """Send an HTTP response with the given status code and JSON body.
+    """
+    payload = json.dumps(body).encode('utf-8')
+    head = 'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n' \
+           'Connection: close\r\n\r\n'.format(status, _REASONS[status], len(payload))
+    writer.write(head.encode('latin-1') + payload)
+    await writer.drain()
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Return the parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(prog='recommend_server',
+                                     description='Serve recommendations over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='the address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000,
+                        help='the port to listen on (default: 8000)')
+    parser.add_argument('--reviews', default='australian_user_reviews.json',
+                        help='the user reviews dataset')
+    parser.add_argument('--games', default='steam_games.json', help='the steam games dataset')
+    parser.add_argument('--cache', default='.graph_cache',
+                        help='the directory of the graph snapshot')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Load the graph and serve recommendations until interrupted, and return the exit status.
+    """
+    args = parse_args(argv)
+    graph = project_total.load_recommendation_graph(args.reviews, args.games, args.cache)
+    server = RecommendationServer(graph)
+    print('Serving on http://{}:{}'.format(args.host, args.port))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+CSC111 Final Project: Bounded result cache for recommendation queries
+"""
+from __future__ import annotations
+from typing import Any, Hashable, Iterable, Optional
+from collections import OrderedDict
+import time
+
+
+class ResultCache:
+    """A least-recently-used cache of query results, with an optional time to live.
+
+    Every entry remembers the vertex items its query involves, so that the entries affected by
+    a change to the graph can be dropped without clearing the whole cache.
+
+    Instance Attributes:
+        - maxsize: the maximum number of entries; 0 disables the cache
+        - ttl: the number of seconds an entry stays valid, or None if entries never expire
+        - hits: the number of lookups that found a valid entry
+        - misses: the number of lookups that did not
+
+    Private Instance Attributes:
+        - _entries: map each key to its (expiry time, involved items, value), least recently
+          used first
+        - _by_item: map each involved item to the keys of the entries that involve it
+
+    Representation Invariants:
+        - len(self._entries) <= self.maxsize
+        - all(key in self._by_item[item] for key in self._entries
+              for item in self._entries[key][1])
+
+    >>> cache = ResultCache(maxsize=2)
+    >>> cache.put(('recommend_games', 'Portal', 10), ['Portal 2'], ['Portal'])
+    >>> cache.get(('recommend_games', 'Portal', 10))
+    ['Portal 2']
+    >>> cache.invalidate(['Portal'])
+    >>> cache.get(('recommend_games', 'Portal', 10)) is None
+    True
+    >>> (cache.hits, cache.misses)
+    (1, 1)
+    """
+    maxsize: int
+    ttl: Optional[float]
+    hits: int
+    misses: int
+    _entries: OrderedDict[Hashable, tuple[float, tuple, Any]]
+    _by_item: dict[Any, set[Hashable]]
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        """Initialize an empty cache with the given size and time to live.
+
+        Preconditions:
+            - maxsize >= 0
+            - ttl is None or ttl > 0
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._by_item = {}
+
+    def __len__(self) -> int:
+        """Return the number of entries in this cache.
+        """
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the value cached under the given key, or None if there is no valid entry.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def put(self, key: Hashable, value: Any, involved: Iterable) -> None:
+        """Cache value under the given key, as the result of a query involving the given items.
+
+        Evict the least recently used entry if the cache is full.
+        """
+        if self.maxsize == 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+        involved = tuple(dict.fromkeys(involved))
+        self._entries[key] = (expires, involved, value)
+        for item in involved:
+            self._by_item.setdefault(item, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, items: Iterable) -> None:
+        """Drop every entry that involves one of the given items.
+        """
+        for item in items:
+            for key in list(self._by_item.get(item, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Drop every entry in this cache. The hit and miss counters are kept.
+        """
+        self._entries.clear()
+        self._by_item.clear()
+
+    def _remove(self, key: Hashable) -> None:
+        """Drop the entry with the given key.
+
+        Preconditions:
+            - key in self._entries
+        """
+        _, involved, _ = self._entries.pop(key)
+        for item in involved:
+            keys = self._by_item[item]
+            keys.discard(key)
+            if not keys:
+                del self._by_item[item]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['collections', 'time'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,137 @@
+"""
+CSC111 Final Project: Follow a growing reviews file and apply new reviews to a loaded graph
+"""
+from __future__ import annotations
+from typing import Optional
+import os
+import threading
+import project_total
+
+
+class ReviewTailer:
+    """Apply the reviews appended to a reviews file to a loaded game recommendation graph,
+    without reloading the file.
+
+    Every poll reads the complete lines added to the file since the last poll, adds their
+    users, games and ratings to the graph the same way load_weighted_graph does, and then
+    recomputes the rows of the graph's neighbour index that the new ratings changed. A line
+    that has not been completely written yet is left for the next poll.
+
+    As with load_weighted_graph(..., streaming=True), a user id that appears on several lines
+    keeps the reviews from all of them.
+
+    Instance Attributes:
+        - graph: the graph the new reviews are applied to
+        - reviews_file: the reviews file being followed
+        - offset: the byte offset in reviews_file up to which the reviews have been applied
+
+    Private Instance Attributes:
+        - _game_files: the filtered games data, in the format of filter_the_games_data
+
+    Representation Invariants:
+        - self.offset >= 0
+
+    >>> import shutil, tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> games_file = os.path.join(directory, 'steam_games.json')
+    >>> with open(games_file, 'w', encoding='utf-8') as f:
+    ...     _ = f.write(repr({'app_name': 'Portal', 'id': '400',
+    ...                       'url': 'http://store.steampowered.com/app/400/'}) + '\\n')
+    >>> reviews_file = os.path.join(directory, 'australian_user_reviews.json')
+    >>> open(reviews_file, 'w', encoding='utf-8').close()
+    >>> graph = project_total.GameRecommendationGraph()
+    >>> tailer = ReviewTailer(graph, reviews_file, games_file)
+    >>> line = repr({'user_id': 'ann', 'user_url': 'http://steamcommunity.com/id/ann',
+    ...              'reviews': [{'funny': '', 'item_id': '400', 'recommend': True,
+    ...                           'review': 'fun'}]}) + '\\n'
+    >>> with open(reviews_file, 'a', encoding='utf-8') as f:
+    ...     _ = f.write(line[:40])
+    >>> (tailer.poll(), tailer.offset, 'ann' in graph.get_all_vertices())
+    (0, 0, False)
+    >>> with open(reviews_file, 'a', encoding='utf-8') as f:
+    ...     _ = f.write(line[40:])
+    >>> (tailer.poll(), tailer.offset == len(line), graph.get_neighbours('ann'))
+    (1, True, {'Portal': 1})
+    >>> tailer.poll()
+    0
+    >>> shutil.rmtree(directory)
+    """
+    graph: project_total.GameRecommendationGraph
+    reviews_file: str
+    offset: int
+    _game_files: dict
+
+    def __init__(self, graph: project_total.GameRecommendationGraph, reviews_file: str,
+                 game_names_file: str, offset: Optional[int] = None) -> None:
+        """Initialize a tailer of reviews_file that applies new reviews to the given graph.
+
+        offset is where the reviews not yet in the graph start. By default, the graph is
+        assumed to hold the whole file as it is now, and only the lines appended from now on
+        are applied.
+
+        Preconditions:
+            - offset is None or offset >= 0
+        """
+        self.graph = graph
+        self.reviews_file = reviews_file
+        self.offset = os.path.getsize(reviews_file) if offset is None else offset
+        self._game_files = project_total.filter_the_games_data(game_names_file)
+
+    def poll(self) -> int:
+        """Apply the complete lines appended to the reviews file since the last poll, and
+        return the number of users applied.
+
+        If the file is now shorter than the offset, it was truncated or replaced, and it is
+        followed again from its start.
+        """
+        if os.path.getsize(self.reviews_file) < self.offset:
+            self.offset = 0
+
+        with open(self.reviews_file, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        # leave the last line for later if it is still being written
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+        self.offset += end
+
+        # the same line breaks as reading the file in text mode
+        text = data[:end].decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        applied = 0
+        for line in text.split('\n'):
+            item = project_total.parse_user_review_line(line)
+            if item is not None:
+                user_id, (reviews, user_url) = project_total.filter_user(item)
+                project_total.add_user_reviews(self.graph, user_id, reviews, user_url,
+                                               self._game_files)
+                applied += 1
+
+        self.graph.refresh_neighbour_index()
+        return applied
+
+    def follow(self, interval: float = 1.0, stop: Optional[threading.Event] = None) -> None:
+        """Poll the reviews file every interval seconds, until stop is set.
+
+        Without a stop event, follow the file forever.
+
+        Preconditions:
+            - interval > 0
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.poll()
+            stop.wait(interval)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['os', 'threading', 'project_total'],
+        'allowed-io': ['ReviewTailer.poll'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,226 @@
+"""
+CSC111 Final Project: Answering friend queries from users sharded across worker processes
+"""
+from __future__ import annotations
+from typing import Any, Optional, Union
+import multiprocessing
+import zlib
+import project_total
+from ranking import top_k
+from sparse_graph import SparseRecommendationGraph
+
+
+def shard_of(user: Any, shards: int) -> int:
+    """Return the shard that holds the given user, out of the given number of shards.
+
+    The shard only depends on the user id, so every process agrees on it without sharing a
+    table of users.
+
+    >>> shard_of('76561197970982479', 1)
+    0
+    >>> shard_of('76561197970982479', 4) == shard_of('76561197970982479', 4)
+    True
+    """
+    return zlib.crc32(str(user).encode('utf-8')) % shards
+
+
+class ShardedRecommender:
+    """Answer find_similar_player queries from users partitioned across worker processes.
+
+    Every worker process reads the datasets itself and keeps only the users of its shard,
+    with their reviews, in a SparseRecommendationGraph, so no process ever holds the whole
+    graph. A query is scattered over local pipes: the shard of the player sends back the
+    player's ratings, then every shard scores its own users against them and sends back its
+    local top limit. Every user lives in exactly one shard, and the order of the results
+    (score descending, then user descending) is total, so the best limit of the merged local
+    results are exactly the global top limit.
+
+    The answers are the same as those of a GameRecommendationGraph loaded with
+    load_weighted_graph(reviews_file, game_names_file, streaming=True).
+
+    Instance Attributes:
+        - shards: the number of worker processes
+
+    Private Instance Attributes:
+        - _connections: the coordinator's end of the pipe to every worker, indexed by shard
+        - _processes: the worker processes, indexed by shard
+
+    >>> import shutil, tempfile
+    >>> from benchmark import generate_dataset
+    >>> directory = tempfile.mkdtemp()
+    >>> reviews_file, games_file = generate_dataset(directory, 60, 8, seed=1)
+    >>> graph = project_total.load_weighted_graph(reviews_file, games_file, streaming=True)
+    >>> users = sorted(graph.get_all_vertices(kind='user')) + ['nobody']
+    >>> with ShardedRecommender(reviews_file, games_file, shards=3) as sharded:
+    ...     answers = [sharded.find_similar_player(user, 5) for user in users]
+    >>> answers == [graph.find_similar_player(user, 5) for user in users]
+    True
+    >>> shutil.rmtree(directory)
+    """
+    shards: int
+    _connections: list
+    _processes: list
+
+    def __init__(self, reviews_file: str, game_names_file: str, shards: int = 2) -> None:
+        """Start the given number of worker processes, and wait until every one of them has
+        loaded its shard of the given datasets.
+
+        Raise a RuntimeError if a worker fails to load its shard.
+
+        Preconditions:
+            - shards >= 1
+        """
+        self.shards = shards
+        self._connections, self._processes = [], []
+        for shard in range(shards):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve_shard, daemon=True,
+                args=(worker_connection, reviews_file, game_names_file, shard, shards))
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        try:
+            self._gather(range(shards))
+        except RuntimeError:
+            self.close()
+            raise
+
+    def __enter__(self) -> ShardedRecommender:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def find_similar_player(self, player: Any,
+                            limit: int) -> Union[list[tuple[str, str]], str]:
+        """find players that has similar ratings to the given player, together with their url.
+
+        Return 'out of range' if player is not a user in the datasets, and
+        'No recommended friends' if no other player has a positive similarity score.
+
+        Raise a RuntimeError if a worker fails to answer.
+
+        Preconditions:
+            - limit >= 1
+        """
+        owner = shard_of(player, self.shards)
+        self._connections[owner].send(('ratings', player))
+        ratings = self._gather([owner])[0]
+        if ratings is None:
+            return 'out of range'
+
+        for connection in self._connections:
+            connection.send(('top', ratings, limit, player))
+        partial = [pair for results in self._gather(range(self.shards)) for pair in results]
+        merged = top_k([((user, url), score) for user, score, url in partial], limit)
+        if len(merged) == 0:
+            return 'No recommended friends'
+        return [(user, url) for (user, url), _ in merged]
+
+    def close(self) -> None:
+        """Stop the worker processes.
+        """
+        for connection in self._connections:
+            try:
+                connection.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._connections, self._processes = [], []
+
+    def _gather(self, shards: Any) -> list:
+        """Return the reply of each of the given shards, in order.
+
+        Raise a RuntimeError if one of them reports an error or has stopped.
+        """
+        replies = []
+        for shard in shards:
+            try:
+                status, payload = self._connections[shard].recv()
+            except EOFError:
+                raise RuntimeError('shard ' + str(shard) + ' stopped') from None
+            if status == 'error':
+                raise RuntimeError('shard ' + str(shard) + ' failed: ' + payload)
+            replies.append(payload)
+        return replies
+
+
+def load_shard(reviews_file: str, game_names_file: str, shard: int,
+               shards: int) -> SparseRecommendationGraph:
+    """Return the graph of the users of the given shard of the given datasets, with their
+    reviews. The reviews file is streamed, so only the shard is ever held in memory.
+
+    Preconditions:
+        - 0 <= shard < shards
+    """
+    game_files = project_total.filter_the_games_data(game_names_file)
+    graph = SparseRecommendationGraph()
+    for user_id, (reviews, user_url) in project_total.iter_filtered_reviews(reviews_file):
+        if shard_of(user_id, shards) == shard:
+            project_total.add_user_reviews(graph, user_id, reviews, user_url, game_files)
+    return graph
+
+
+def _serve_shard(connection: Any, reviews_file: str, game_names_file: str, shard: int,
+                 shards: int) -> None:
+    """Load the given shard, then answer the requests sent on connection until told to stop.
+
+    Every reply is ('ok', payload) or ('error', message).
+    """
+    try:
+        graph = load_shard(reviews_file, game_names_file, shard, shards)
+    except Exception as error:  # report the failure instead of leaving the coordinator waiting
+        connection.send(('error', repr(error)))
+        return
+    connection.send(('ok', None))
+
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request[0] == 'stop':
+            return
+        try:
+            connection.send(('ok', _answer(graph, request)))
+        except Exception as error:  # one failed query must not stop the shard
+            connection.send(('error', repr(error)))
+
+
+def _answer(graph: SparseRecommendationGraph, request: tuple) -> Optional[Any]:
+    """Return the answer of the given shard graph to the given request.
+
+    ('ratings', user) asks for the ratings of user, mapping game items to weights, or None if
+    user is not a user of this shard. ('top', ratings, limit, user) asks for the
+    (user, score, url) triples of the limit users of this shard most similar to a user with
+    the given ratings, other than user.
+    """
+    if request[0] == 'ratings':
+        try:
+            kind = graph.get_kind(request[1])
+        except KeyError:
+            return None
+        return graph.get_neighbours(request[1]) if kind == 'user' else None
+    else:
+        _, ratings, limit, user = request
+        return [(other, score, graph.get_url(other))
+                for other, score in graph.top_similar_users(ratings, limit, exclude=user)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['multiprocessing', 'zlib', 'project_total', 'ranking',
+                          'sparse_graph'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,205 @@
+"""
+CSC111 Final Project: Binary snapshots of a loaded game recommendation graph
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional
+import hashlib
+import json
+import os
+import numpy as np
+from sparse_graph import SparseRecommendationGraph
+
+# bump this whenever the layout of a snapshot changes, so that old snapshots are rebuilt
+SNAPSHOT_VERSION = 1
+
+# the flat arrays stored in a snapshot, one .npy file each
+_ARRAYS = ('csr_indptr', 'csr_indices', 'csr_data', 'csc_indptr', 'csc_indices', 'csc_data',
+           'user_names', 'user_name_offsets', 'user_urls', 'user_url_offsets',
+           'game_names', 'game_name_offsets', 'game_urls', 'game_url_offsets')
+
+
+def load_cached_graph(reviews_file: str, game_names_file: str, directory: str,
+                      build: Callable[[str, str], Any], graph_class: type) -> Any:
+    """Return the graph of the given datasets, from the snapshot in directory if it is up to
+    date, or else by calling build(reviews_file, game_names_file) and saving a new snapshot.
+
+    graph_class is the class of the returned graph when it comes from the snapshot:
+    SparseRecommendationGraph uses the memory-mapped arrays directly, and any other class
+    (such as GameRecommendationGraph) is filled in with add_vertex and add_edge.
+    """
+    sources = [reviews_file, game_names_file]
+    graph = load_snapshot(directory, sources, graph_class)
+    if graph is None:
+        graph = build(reviews_file, game_names_file)
+        save_snapshot(graph, directory, sources)
+    return graph
+
+
+def save_snapshot(graph: Any, directory: str, sources: list[str]) -> None:
+    """Save the given graph as a snapshot in directory, together with the fingerprints of
+    the source files it was loaded from.
+
+    graph may be a GameRecommendationGraph or a SparseRecommendationGraph.
+    """
+    if not isinstance(graph, SparseRecommendationGraph):
+        graph = SparseRecommendationGraph.from_graph(graph)
+
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, 'meta.json')
+    # a snapshot without its meta.json is incomplete and never loaded
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    arrays = {}
+    for kind in ('user', 'game'):
+        items, urls = graph.get_vertex_table(kind)
+        arrays[kind + '_names'], arrays[kind + '_name_offsets'] = _pack_strings(items)
+        arrays[kind + '_urls'], arrays[kind + '_url_offsets'] = _pack_strings(urls)
+    for form, (indptr, indices, data) in (('csr', graph.get_csr()), ('csc', graph.get_csc())):
+        arrays[form + '_indptr'], arrays[form + '_indices'], arrays[form + '_data'] = \
+            indptr, indices, data
+    for name in _ARRAYS:
+        np.save(os.path.join(directory, name + '.npy'), arrays[name])
+
+    _write_meta(directory, {'version': SNAPSHOT_VERSION,
+                            'sources': [_fingerprint(source, with_hash=True)
+                                        for source in sources]})
+
+
+def load_snapshot(directory: str, sources: list[str], graph_class: type,
+                  verify_hash: bool = False) -> Optional[Any]:
+    """Return the graph saved in directory, or None if there is no complete snapshot there or
+    if it is out of date with the given source files.
+
+    A snapshot is out of date when the size of a source file changed, or when its
+    modification time changed and so did its content hash. If verify_hash is True, the hashes
+    are always compared, even when the modification times match. When only the modification
+    time of a source file changed, the new time is saved, so that the file is not hashed again
+    on the next load. A snapshot whose arrays cannot be read is treated as missing.
+    """
+    meta = _read_meta(directory)
+    if meta is None or meta.get('version') != SNAPSHOT_VERSION \
+            or len(meta['sources']) != len(sources):
+        return None
+    saved_times = [saved['mtime_ns'] for saved in meta['sources']]
+    for saved, source in zip(meta['sources'], sources):
+        if not _still_matches(saved, source, verify_hash):
+            return None
+
+    try:
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+                  for name in _ARRAYS}
+    except (OSError, ValueError):
+        return None
+    if [saved['mtime_ns'] for saved in meta['sources']] != saved_times:
+        try:
+            _write_meta(directory, meta)
+        except OSError:
+            pass  # a read-only snapshot still loads; the files are just hashed again next time
+
+    users = (_unpack_strings(arrays['user_names'], arrays['user_name_offsets']),
+             _unpack_strings(arrays['user_urls'], arrays['user_url_offsets']))
+    games = (_unpack_strings(arrays['game_names'], arrays['game_name_offsets']),
+             _unpack_strings(arrays['game_urls'], arrays['game_url_offsets']))
+    csr = (arrays['csr_indptr'], arrays['csr_indices'], arrays['csr_data'])
+    csc = (arrays['csc_indptr'], arrays['csc_indices'], arrays['csc_data'])
+    if issubclass(graph_class, SparseRecommendationGraph):
+        return graph_class.from_arrays(users, games, csr, csc)
+
+    graph = graph_class()
+    for kind, (items, urls) in (('user', users), ('game', games)):
+        for item, url in zip(items, urls):
+            graph.add_vertex(item, kind, url)
+    indptr, indices, data = (np.asarray(array) for array in csr)
+    game_items = games[0]
+    for i, user in enumerate(users[0]):
+        for j, weight in zip(indices[indptr[i]:indptr[i + 1]].tolist(),
+                             data[indptr[i]:indptr[i + 1]].tolist()):
+            graph.add_edge(user, game_items[j], int(weight) if weight.is_integer() else weight)
+    return graph
+
+
+def _read_meta(directory: str) -> Optional[dict]:
+    """Return the metadata of the snapshot in directory, or None if there is none.
+    """
+    try:
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(directory: str, meta: dict) -> None:
+    """Write the metadata of the snapshot in directory.
+    """
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def _still_matches(saved: dict, source: str, verify_hash: bool) -> bool:
+    """Return whether the source file still matches the fingerprint saved for it.
+
+    If the file matches but its modification time changed, the new time is stored in saved.
+    """
+    try:
+        current = _fingerprint(source, with_hash=False)
+    except OSError:
+        return False
+    if current['size'] != saved['size']:
+        return False
+    if current['mtime_ns'] == saved['mtime_ns'] and not verify_hash:
+        return True
+    # the file was touched or copied: only its content decides
+    if _file_hash(source) != saved['hash']:
+        return False
+    saved['mtime_ns'] = current['mtime_ns']
+    return True
+
+
+def _fingerprint(file_name: str, with_hash: bool) -> dict:
+    """Return the size, modification time and, if with_hash is True, the content hash of
+    the given file.
+    """
+    stat = os.stat(file_name)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        fingerprint['hash'] = _file_hash(file_name)
+    return fingerprint
+
+
+def _file_hash(file_name: str) -> str:
+    """Return the BLAKE2b hash of the content of the given file.
+    """
+    digest = hashlib.blake2b()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _pack_strings(strings: list) -> tuple[np.ndarray, np.ndarray]:
+    """Return the given strings encoded as one flat UTF-8 byte array, together with the
+    int64 offsets where each string starts and the last one ends.
+    """
+    encoded = [str(s).encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> list[str]:
+    """Return the strings packed by _pack_strings.
+    """
+    blob = data.tobytes()
+    bounds = offsets.tolist()
+    return [blob[start:end].decode('utf-8') for start, end in zip(bounds, bounds[1:])]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['hashlib', 'json', 'os', 'numpy', 'sparse_graph'],
+        'allowed-io': ['_read_meta', '_write_meta', '_file_hash'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,709 @@
+"""
+CSC111 Final Project: Sparse-matrix backend for the game recommendation graph
+"""
+from __future__ import annotations
+from typing import Any, Union
+import numpy as np
+from ranking import top_k_indices
+
+
+class SparseRecommendationGraph:
+    """A game recommendation graph that stores the ratings in compressed sparse arrays.
+
+    Every user and every game is mapped to a dense integer id, in the order they were added.
+    The ratings form a users x games matrix, which is stored twice: in compressed sparse row
+    form (for each user, the games they rated) and in compressed sparse column form (for each
+    game, the users that rated it). Both use int32 indices and float32 weights.
+
+    New edges are buffered in a small dictionary and merged into the arrays the next time
+    the arrays are needed, so loading a graph edge by edge stays cheap.
+
+    Private Instance Attributes:
+        - _user_ids: map each user item to its dense id
+        - _game_ids: map each game item to its dense id
+        - _user_items: the user items, indexed by their dense id
+        - _game_items: the game items, indexed by their dense id
+        - _user_urls: the url of each user, indexed by their dense id
+        - _game_urls: the url of each game, indexed by their dense id
+        - _row_indptr, _row_indices, _row_data: the ratings in compressed sparse row form
+        - _col_indptr, _col_indices, _col_data: the ratings in compressed sparse column form
+        - _user_sq_norms: the squared length of each user's rating vector
+        - _game_sq_norms: the squared length of each game's rating vector
+        - _pending: the edges that have not been merged into the arrays yet,
+          mapping (user id, game id) to the weight
+
+    Representation Invariants:
+        - not any(item in self._game_ids for item in self._user_ids)
+        - len(self._user_items) == len(self._user_urls) == len(self._user_ids)
+        - len(self._game_items) == len(self._game_urls) == len(self._game_ids)
+        - the column indices of each row of the compressed sparse row form are sorted
+    """
+    _user_ids: dict[Any, int]
+    _game_ids: dict[Any, int]
+    _user_items: list
+    _game_items: list
+    _user_urls: list[str]
+    _game_urls: list[str]
+    _row_indptr: np.ndarray
+    _row_indices: np.ndarray
+    _row_data: np.ndarray
+    _col_indptr: np.ndarray
+    _col_indices: np.ndarray
+    _col_data: np.ndarray
+    _user_sq_norms: np.ndarray
+    _game_sq_norms: np.ndarray
+    _pending: dict[tuple[int, int], float]
+
+    def __init__(self) -> None:
+        """Initialize a new empty sparse game recommendation graph.
+        """
+        self._user_ids = {}
+        self._game_ids = {}
+        self._user_items = []
+        self._game_items = []
+        self._user_urls = []
+        self._game_urls = []
+        self._pending = {}
+        self._set_edges(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32),
+                        np.zeros(0, dtype=np.float32))
+
+    @classmethod
+    def from_graph(cls, graph: Any) -> SparseRecommendationGraph:
+        """Return a sparse copy of the given GameRecommendationGraph.
+
+        Dense ids are assigned in sorted order of the items, so that copies of the same graph
+        always get the same ids.
+        """
+        sparse = cls()
+        for kind in ('user', 'game'):
+            for item in sorted(graph.get_all_vertices(kind=kind), key=str):
+                sparse.add_vertex(item, kind, graph.get_url(item))
+
+        rows, cols, data = [], [], []
+        for user, user_id in sparse._user_ids.items():
+            for game, weight in graph.get_neighbours(user).items():
+                if game in sparse._game_ids:
+                    rows.append(user_id)
+                    cols.append(sparse._game_ids[game])
+                    data.append(weight)
+
+        sparse._set_edges(np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32),
+                          np.array(data, dtype=np.float32))
+        return sparse
+
+    @classmethod
+    def from_arrays(cls, users: tuple[list, list[str]], games: tuple[list, list[str]],
+                    csr: tuple[np.ndarray, np.ndarray, np.ndarray],
+                    csc: tuple[np.ndarray, np.ndarray, np.ndarray]) -> SparseRecommendationGraph:
+        """Return a sparse graph that uses the given arrays directly, without copying them.
+
+        users and games are the (items, urls) lists in dense id order, as returned by
+        get_vertex_table, and csr and csc are the arrays returned by get_csr and get_csc.
+        The arrays may be memory-mapped; they are only replaced once new edges are added.
+        """
+        sparse = cls()
+        sparse._user_items, sparse._user_urls = list(users[0]), list(users[1])
+        sparse._game_items, sparse._game_urls = list(games[0]), list(games[1])
+        sparse._user_ids = {item: i for i, item in enumerate(sparse._user_items)}
+        sparse._game_ids = {item: i for i, item in enumerate(sparse._game_items)}
+        sparse._row_indptr, sparse._row_indices, sparse._row_data = csr
+        sparse._col_indptr, sparse._col_indices, sparse._col_data = csc
+
+        counts = np.diff(sparse._row_indptr)
+        rows = np.repeat(np.arange(len(counts)), counts)
+        squares = sparse._row_data.astype(np.float64) ** 2
+        sparse._user_sq_norms = np.bincount(rows, weights=squares, minlength=len(counts))
+        sparse._game_sq_norms = np.bincount(sparse._row_indices, weights=squares,
+                                            minlength=len(sparse._game_items))
+        return sparse
+
+    def add_vertex(self, item: Any, kind: str, url: str) -> None:
+        """Add a new vertex in this graph.
+
+        Do nothing if item is already a vertex in this graph.
+
+        Preconditions:
+            - kind in {'user', 'game'}
+        """
+        if self._has_vertex(item):
+            return
+        if kind == 'user':
+            self._user_ids[item] = len(self._user_items)
+            self._user_items.append(item)
+            self._user_urls.append(url)
+        else:
+            self._game_ids[item] = len(self._game_items)
+            self._game_items.append(item)
+            self._game_urls.append(url)
+
+    def add_edge(self, item1: Any, item2: Any, weight: Union[int, float]) -> None:
+        """Add an edge between the two vertices with the given items in this graph,
+        with the given weight.
+
+        Raise a ValueError if item1 or item2 do not appear as vertices in this graph,
+        or if they are not one user and one game.
+        """
+        user_id, game_id = self._edge_ids(item1, item2)
+        self._pending[(user_id, game_id)] = weight
+
+    def adjacent(self, item1: Any, item2: Any) -> bool:
+        """Return whether item1 and item2 are adjacent vertices in this graph.
+
+        Return False if item1 or item2 do not appear as vertices in this graph.
+        """
+        try:
+            user_id, game_id = self._edge_ids(item1, item2)
+        except ValueError:
+            return False
+        return (user_id, game_id) in self._pending or self._find(user_id, game_id) != -1
+
+    def get_weight(self, item1: Any, item2: Any) -> Union[int, float]:
+        """Return the weight of the edge between the given items.
+
+        Return 0 if item1 and item2 are not adjacent.
+
+        Preconditions:
+            - item1 and item2 are vertices in this graph
+        """
+        try:
+            user_id, game_id = self._edge_ids(item1, item2)
+        except ValueError:
+            return 0
+        if (user_id, game_id) in self._pending:
+            return self._pending[(user_id, game_id)]
+        position = self._find(user_id, game_id)
+        if position == -1:
+            return 0
+        return float(self._row_data[position])
+
+    def get_all_vertices(self, kind: str = '') -> set:
+        """Return a set of all vertex items in this graph.
+
+        If kind != '', only return the items of the given vertex kind.
+
+        Preconditions:
+            - kind in {'', 'user', 'game'}
+        """
+        if kind == 'user':
+            return set(self._user_items)
+        elif kind == 'game':
+            return set(self._game_items)
+        else:
+            return set(self._user_items) | set(self._game_items)
+
+    def get_kind(self, item: Any) -> str:
+        """Return the kind of the vertex with the given item: 'user' or 'game'.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        if item in self._user_ids:
+            return 'user'
+        elif item in self._game_ids:
+            return 'game'
+        else:
+            raise KeyError(item)
+
+    def get_url(self, item: Any) -> str:
+        """Return the url page of the vertex with the given item.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        if item in self._user_ids:
+            return self._user_urls[self._user_ids[item]]
+        else:
+            return self._game_urls[self._game_ids[item]]
+
+    def get_neighbours(self, item: Any) -> dict[Any, Union[int, float]]:
+        """Return a dictionary mapping each neighbour item of the given item to the
+        weight of the edge between them.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        self._compact()
+        if item in self._user_ids:
+            i = self._user_ids[item]
+            start, end = self._row_indptr[i], self._row_indptr[i + 1]
+            names, indices, data = self._game_items, self._row_indices, self._row_data
+        else:
+            i = self._game_ids[item]
+            start, end = self._col_indptr[i], self._col_indptr[i + 1]
+            names, indices, data = self._user_items, self._col_indices, self._col_data
+        return {names[j]: float(w) for j, w in zip(indices[start:end], data[start:end])}
+
+    def get_vertex_table(self, kind: str) -> tuple[list, list[str]]:
+        """Return the items and the urls of all vertices of the given kind, in dense id order.
+
+        Preconditions:
+            - kind in {'user', 'game'}
+        """
+        if kind == 'user':
+            return self._user_items, self._user_urls
+        else:
+            return self._game_items, self._game_urls
+
+    def get_csr(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the (indptr, indices, data) arrays of the users x games rating matrix
+        in compressed sparse row form.
+
+        Row i belongs to the user with dense id i; the indices are game ids.
+        """
+        self._compact()
+        return self._row_indptr, self._row_indices, self._row_data
+
+    def get_csc(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the (indptr, indices, data) arrays of the users x games rating matrix
+        in compressed sparse column form.
+
+        Column j belongs to the game with dense id j; the indices are user ids.
+        """
+        self._compact()
+        return self._col_indptr, self._col_indices, self._col_data
+
+    def nbytes(self) -> int:
+        """Return the number of bytes used by the rating arrays of this graph.
+        """
+        self._compact()
+        return sum(array.nbytes for array in (self._row_indptr, self._row_indices, self._row_data,
+                                              self._col_indptr, self._col_indices, self._col_data))
+
+    ################################################################################################
+    # vectorized similarity queries
+    ################################################################################################
+
+    def similarity_scores(self, item: Any) -> np.ndarray:
+        """Return the consice similarity between the given item and every vertex of the same kind,
+        as an array indexed by dense id.
+
+        The scores are the same as consice_similarity gives, rounded to 2 decimals. The score
+        of the item with itself is 0. All the scores come from one sparse matrix-vector
+        product against the cached squared norms, without walking any Python objects.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        self._compact()
+        if item in self._user_ids:
+            i = self._user_ids[item]
+            own = (self._row_indptr, self._row_indices, self._row_data)
+            other = (self._col_indptr, self._col_indices, self._col_data)
+            sq_norms = self._user_sq_norms
+        else:
+            i = self._game_ids[item]
+            own = (self._col_indptr, self._col_indices, self._col_data)
+            other = (self._row_indptr, self._row_indices, self._row_data)
+            sq_norms = self._game_sq_norms
+
+        start, end = own[0][i], own[0][i + 1]
+        targets, values = _gather(*other, own[1][start:end], own[2][start:end])
+        above = np.bincount(targets, weights=values, minlength=len(sq_norms))
+        above[i] = 0
+
+        scores = np.zeros(len(sq_norms))
+        candidates = np.flatnonzero(above)
+        below = np.sqrt(sq_norms[candidates]) * np.sqrt(sq_norms[i])
+        nonzero = below != 0
+        candidates, below = candidates[nonzero], below[nonzero]
+        scores[candidates] = _round2(above[candidates] / below)
+        return scores
+
+    def similarity_to(self, item: Any, ids: np.ndarray) -> np.ndarray:
+        """Return the consice similarity between the given item and each vertex of the same kind
+        with one of the given dense ids, as an array aligned with ids.
+
+        The scores are the same as similarity_scores gives, but only the rows of the given
+        vertices are read, in one pass, so the cost grows with their number of ratings instead
+        of with the size of the graph.
+
+        Preconditions:
+            - item is a vertex in this graph
+            - ids contains dense ids of vertices of the same kind as item
+        """
+        self._compact()
+        if item in self._user_ids:
+            i = self._user_ids[item]
+            own = (self._row_indptr, self._row_indices, self._row_data)
+            sq_norms, width = self._user_sq_norms, len(self._game_items)
+        else:
+            i = self._game_ids[item]
+            own = (self._col_indptr, self._col_indices, self._col_data)
+            sq_norms, width = self._game_sq_norms, len(self._user_items)
+
+        ratings = np.zeros(width)
+        start, end = own[0][i], own[0][i + 1]
+        ratings[own[1][start:end]] = own[2][start:end]
+        ids = np.asarray(ids, dtype=np.int64)
+        targets, values = _gather(*own, ids, np.ones(len(ids)))
+        lengths = (own[0][ids + 1] - own[0][ids]).astype(np.int64)
+        above = np.bincount(np.repeat(np.arange(len(ids)), lengths),
+                            weights=values * ratings[targets], minlength=len(ids))
+
+        below = np.sqrt(sq_norms[ids]) * np.sqrt(sq_norms[i])
+        scores = np.zeros(len(ids))
+        nonzero = (above != 0) & (below != 0) & (ids != i)
+        scores[nonzero] = _round2(above[nonzero] / below[nonzero])
+        return scores
+
+    def similarity_block(self, kind: str, start: int, end: int) -> np.ndarray:
+        """Return the consice similarity between every vertex of the given kind with a dense id
+        in range(start, end) and every vertex of that kind, as an array of shape
+        (end - start, number of vertices of that kind).
+
+        Row r holds the same scores as similarity_scores gives for the vertex with dense id
+        start + r. The whole block comes from one sparse matrix-matrix product, so it uses
+        O((end - start) * number of vertices) memory.
+
+        Preconditions:
+            - kind in {'user', 'game'}
+            - 0 <= start <= end <= len(self.get_vertex_table(kind)[0])
+        """
+        return self._similarity_rows(kind, np.arange(start, end))
+
+    def top_similar_users(self, ratings: dict[Any, Union[int, float]], limit: int,
+                          exclude: Any = None) -> list[tuple[Any, float]]:
+        """Return the (user, score) pairs of the limit users with the highest positive consice
+        similarity to a user with the given ratings, mapping game items to weights, best first,
+        with ties ordered by user descending. The user exclude, if given, is left out.
+
+        The rated games need not be in this graph, and the rating user need not be either, so
+        a graph that holds only some of the users can score them against any user. The scores
+        are the same as similarity_scores gives, and come from one sparse matrix-vector
+        product.
+        """
+        self._compact()
+        known = [(self._game_ids[game], weight) for game, weight in ratings.items()
+                 if game in self._game_ids]
+        ids = np.array([game_id for game_id, _ in known], dtype=np.int64)
+        weights = np.array([weight for _, weight in known], dtype=np.float64)
+        targets, values = _gather(self._col_indptr, self._col_indices, self._col_data, ids,
+                                  weights)
+        above = np.bincount(targets, weights=values, minlength=len(self._user_items))
+        if exclude in self._user_ids:
+            above[self._user_ids[exclude]] = 0
+
+        sq_norm = sum(weight ** 2 for weight in ratings.values())
+        candidates = np.flatnonzero(above)
+        below = np.sqrt(self._user_sq_norms[candidates]) * np.sqrt(sq_norm)
+        nonzero = below != 0
+        candidates = candidates[nonzero]
+        scores = _round2(above[candidates] / below[nonzero])
+        positive = scores > 0
+        candidates, scores = candidates[positive], scores[positive]
+        best = top_k_indices(scores, _Take(self._user_items, candidates), limit)
+        return [(self._user_items[candidates[b]], float(scores[b])) for b in best]
+
+    def top_games_for_user(self, user: Any, limit: int) -> list[tuple[Any, float]]:
+        """Return the (game, score) pairs of the limit games the given user has not rated with
+        the highest positive score for that user, best first, with ties ordered by game
+        descending.
+
+        The score of a game is the sum, over every game the user rated, of the rating times
+        the consice similarity of the two games, rounded to 2 decimals. The similarities of
+        the rated games come from one sparse matrix-matrix product, and their weighted sum
+        from one vector-matrix product.
+
+        Preconditions:
+            - user is a user vertex in this graph
+        """
+        self._compact()
+        i = self._user_ids[user]
+        start, end = self._row_indptr[i], self._row_indptr[i + 1]
+        rated = self._row_indices[start:end]
+        ratings = self._row_data[start:end].astype(np.float64)
+        scores = _round2(ratings @ self._similarity_rows('game', rated))
+        scores[rated] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        best = top_k_indices(scores[candidates], _Take(self._game_items, candidates), limit)
+        return [(self._game_items[j], float(scores[j])) for j in candidates[best].tolist()]
+
+    def _similarity_rows(self, kind: str, ids: np.ndarray) -> np.ndarray:
+        """Return the consice similarity between every vertex of the given kind with one of the
+        given dense ids and every vertex of that kind, as an array of shape
+        (len(ids), number of vertices of that kind).
+
+        Row r holds the same scores as similarity_scores gives for the vertex with dense id
+        ids[r], all from one sparse matrix-matrix product.
+
+        Preconditions:
+            - kind in {'user', 'game'}
+            - ids contains distinct dense ids of vertices of the given kind
+        """
+        self._compact()
+        if kind == 'user':
+            own = (self._row_indptr, self._row_indices, self._row_data)
+            other = (self._col_indptr, self._col_indices, self._col_data)
+            sq_norms = self._user_sq_norms
+        else:
+            own = (self._col_indptr, self._col_indices, self._col_data)
+            other = (self._row_indptr, self._row_indices, self._row_data)
+            sq_norms = self._game_sq_norms
+        n, ids = len(sq_norms), np.asarray(ids, dtype=np.int64)
+
+        middles, weights = _gather(*own, ids, np.ones(len(ids)))
+        targets, values = _gather(*other, middles, weights)
+        # the row of every stored entry of the given vertices, then of every gathered value
+        rows = np.repeat(np.arange(len(ids), dtype=np.int64), own[0][ids + 1] - own[0][ids])
+        rows = np.repeat(rows, np.diff(other[0])[middles])
+        above = np.bincount(rows * n + targets, weights=values,
+                            minlength=len(ids) * n).reshape(len(ids), n)
+        above[np.arange(len(ids)), ids] = 0
+
+        below = np.sqrt(sq_norms[ids])[:, np.newaxis] * np.sqrt(sq_norms)[np.newaxis, :]
+        scores = np.zeros((len(ids), n))
+        nonzero = (above != 0) & (below != 0)
+        scores[nonzero] = _round2(above[nonzero] / below[nonzero])
+        return scores
+
+    def get_two_items_similarity_score(self, item1: Any, item2: Any) -> float:
+        """Return the consice similarity score of two items.
+
+        Raise a ValueError if item1 or item2 do not appear as vertices in this graph.
+        """
+        if item1 in self._user_ids and item2 in self._user_ids:
+            self._compact()
+            i, j = self._user_ids[item1], self._user_ids[item2]
+            indptr, indices, data = self._row_indptr, self._row_indices, self._row_data
+            sq_norms = self._user_sq_norms
+        elif item1 in self._game_ids and item2 in self._game_ids:
+            self._compact()
+            i, j = self._game_ids[item1], self._game_ids[item2]
+            indptr, indices, data = self._col_indptr, self._col_indices, self._col_data
+            sq_norms = self._game_sq_norms
+        elif self._has_vertex(item1) and self._has_vertex(item2):
+            # a user and a game never share a neighbour
+            return 0
+        else:
+            raise ValueError
+
+        _, in_i, in_j = np.intersect1d(indices[indptr[i]:indptr[i + 1]],
+                                       indices[indptr[j]:indptr[j + 1]],
+                                       assume_unique=True, return_indices=True)
+        above = float(np.dot(data[indptr[i] + in_i].astype(np.float64),
+                             data[indptr[j] + in_j].astype(np.float64)))
+        below = float(np.sqrt(sq_norms[i]) * np.sqrt(sq_norms[j]))
+        if above == 0 or below == 0:
+            return 0
+        else:
+            return round(above / below, 2)
+
+    def find_similar_player(self, player: Any, limit: int) -> Union[list[tuple[str, str]], str]:
+        """Return at most limit players that have similar ratings to the given player,
+        together with their url.
+
+        Return 'out of range' if player is not in this graph, and 'No recommended friends'
+        if no other player has a positive similarity score.
+
+        Preconditions:
+            - limit >= 1
+        """
+        if not self._has_vertex(player):
+            return 'out of range'
+        if player not in self._user_ids:
+            return 'No recommended friends'
+
+        result = [(user, self.get_url(user)) for user, _ in self.top_similar(player, limit)]
+        return result if result else 'No recommended friends'
+
+    def recommend_games(self, game: Any, limit: int) -> Union[list[tuple[str, str]], str]:
+        """Return at most limit games that have similar ratings to the given game,
+        together with their url.
+
+        Return 'out of range' if game is not in this graph, and 'No recommended games'
+        if no other game has a positive similarity score.
+
+        Preconditions:
+            - limit >= 1
+        """
+        if not self._has_vertex(game):
+            return 'out of range'
+        if game not in self._game_ids:
+            return 'No recommended games'
+
+        result = [(name, self.get_url(name)) for name, _ in self.top_similar(game, limit)]
+        return result if result else 'No recommended games'
+
+    def recommend_games_for_user(self, user: Any,
+                                 limit: int) -> Union[list[tuple[str, str]], str]:
+        """Return at most limit games the given user has not rated yet that are similar to the
+        games they rated, together with their url.
+
+        Return 'out of range' if user is not in this graph, and 'No recommended games'
+        if no unrated game has a positive score. See top_games_for_user for the scores.
+
+        Preconditions:
+            - limit >= 1
+        """
+        if not self._has_vertex(user):
+            return 'out of range'
+        if user not in self._user_ids:
+            return 'No recommended games'
+
+        result = [(name, self.get_url(name))
+                  for name, _ in self.top_games_for_user(user, limit)]
+        return result if result else 'No recommended games'
+
+    def top_similar(self, item: Any, limit: int) -> list[tuple[Any, float]]:
+        """Return the (item, score) pairs of the limit vertices with the highest positive
+        similarity score to the given item, best first.
+
+        Ties are ordered the same way as GameRecommendationGraph orders them: by score
+        descending, then by item descending.
+
+        Preconditions:
+            - item is a vertex in this graph
+        """
+        items = self._user_items if item in self._user_ids else self._game_items
+        scores = self.similarity_scores(item)
+        candidates = np.flatnonzero(scores > 0)
+        best = top_k_indices(scores[candidates], _Take(items, candidates), limit)
+        return [(items[j], float(scores[j])) for j in candidates[best].tolist()]
+
+    ################################################################################################
+    # helpers that maintain the compressed sparse arrays
+    ################################################################################################
+
+    def _has_vertex(self, item: Any) -> bool:
+        """Return whether item is a vertex in this graph.
+        """
+        return item in self._user_ids or item in self._game_ids
+
+    def _edge_ids(self, item1: Any, item2: Any) -> tuple[int, int]:
+        """Return the (user id, game id) pair of an edge between item1 and item2.
+
+        Raise a ValueError if item1 or item2 do not appear as vertices in this graph,
+        or if they are not one user and one game.
+        """
+        if item1 in self._user_ids and item2 in self._game_ids:
+            return self._user_ids[item1], self._game_ids[item2]
+        elif item2 in self._user_ids and item1 in self._game_ids:
+            return self._user_ids[item2], self._game_ids[item1]
+        else:
+            raise ValueError
+
+    def _find(self, user_id: int, game_id: int) -> int:
+        """Return the position of the (user_id, game_id) edge in the row arrays,
+        or -1 if it is not stored there.
+        """
+        if user_id + 1 >= len(self._row_indptr):
+            return -1
+        start, end = self._row_indptr[user_id], self._row_indptr[user_id + 1]
+        position = start + int(np.searchsorted(self._row_indices[start:end], game_id))
+        if position < end and self._row_indices[position] == game_id:
+            return int(position)
+        return -1
+
+    def _compact(self) -> None:
+        """Merge the pending edges into the compressed sparse arrays.
+
+        A pending edge replaces a stored edge between the same two vertices.
+        """
+        n_users = len(self._user_items)
+        if not self._pending and len(self._row_indptr) == n_users + 1 \
+                and len(self._col_indptr) == len(self._game_items) + 1:
+            return
+
+        counts = np.diff(self._row_indptr)
+        rows = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        cols = self._row_indices
+        data = self._row_data
+        if self._pending:
+            pending_keys = np.array(list(self._pending.keys()), dtype=np.int32).reshape(-1, 2)
+            rows = np.concatenate([rows, pending_keys[:, 0]])
+            cols = np.concatenate([cols, pending_keys[:, 1]])
+            data = np.concatenate([data, np.array(list(self._pending.values()),
+                                                   dtype=np.float32)])
+        self._pending = {}
+        self._set_edges(rows, cols, data)
+
+    def _set_edges(self, rows: np.ndarray, cols: np.ndarray, data: np.ndarray) -> None:
+        """Rebuild the compressed sparse arrays from the given edges in coordinate form.
+
+        When an edge appears more than once, the last occurrence wins.
+        """
+        n_users, n_games = len(self._user_items), len(self._game_items)
+
+        keys = rows.astype(np.int64) * max(n_games, 1) + cols
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        order = order[last]
+        rows, cols, data = rows[order], cols[order], data[order]
+
+        self._row_indptr = _indptr(rows, n_users)
+        self._row_indices = cols.astype(np.int32)
+        self._row_data = data.astype(np.float32)
+
+        by_col = np.argsort(cols, kind='stable')
+        self._col_indptr = _indptr(cols[by_col], n_games)
+        self._col_indices = rows[by_col].astype(np.int32)
+        self._col_data = self._row_data[by_col]
+
+        squares = self._row_data.astype(np.float64) ** 2
+        self._user_sq_norms = np.bincount(rows, weights=squares, minlength=n_users)
+        self._game_sq_norms = np.bincount(cols, weights=squares, minlength=n_games)
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+            ids: np.ndarray, weights: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the indices stored in the given rows of a compressed sparse matrix, together with
+    their data multiplied by the weight of their row.
+
+    Summing the returned values by index gives the product of the matrix with the sparse vector
+    that has the given weights at the given row ids.
+    """
+    starts = indptr[ids].astype(np.int64)
+    lengths = indptr[ids + 1] - starts
+    total = int(lengths.sum())
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+    values = data[offsets].astype(np.float64) * np.repeat(weights.astype(np.float64), lengths)
+    return indices[offsets], values
+
+
+def _round2(scores: np.ndarray) -> np.ndarray:
+    """Return the given scores rounded to 2 decimals exactly as the built-in round would.
+
+    np.round scales by 100 first, which can push a score that sits right at a rounding boundary
+    to the wrong side, so those few scores are rounded again one by one.
+    """
+    rounded = np.round(scores, 2)
+    scaled = scores * 100
+    near_half = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for k in near_half.tolist():
+        rounded[k] = round(float(scores[k]), 2)
+    return rounded
+
+
+class _Take:
+    """A read-only view of the items at the given positions of a list.
+    """
+    _items: list
+    _positions: np.ndarray
+
+    def __init__(self, items: list, positions: np.ndarray) -> None:
+        self._items = items
+        self._positions = positions
+
+    def __getitem__(self, i: int) -> Any:
+        return self._items[self._positions[i]]
+
+
+def _indptr(sorted_ids: np.ndarray, n: int) -> np.ndarray:
+    """Return the index pointer array of a compressed sparse matrix with n rows,
+    given the sorted row id of every stored entry.
+    """
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(sorted_ids, minlength=n), out=indptr[1:])
+    return indptr
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'ranking'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
@@ -0,0 +1,173 @@
+"""
+CSC111 Final Project: Content-based game similarity from Steam tags
+"""
+from __future__ import annotations
+from typing import Any
+import numpy as np
+from ranking import top_k, top_k_indices
+
+
+class TagIndex:
+    """TF-IDF vectors of the tags of every game in the Steam catalog.
+
+    Every game is a vector over the tags (or, for games without tags, the genres) of the
+    catalog: a tag the game has weighs its inverse document frequency, log((1 + n) / (1 + df))
+    + 1 for a tag that df of the n games have, and every vector has length 1. The similarity
+    of two games is the cosine of their vectors, and the similarities of one game with the
+    whole catalog come from a single sparse matrix-vector product.
+
+    Unlike the review-based scores, this covers games nobody has reviewed yet.
+
+    Instance Attributes:
+        - names: the game names, indexed by row, in the order of the catalog
+
+    Private Instance Attributes:
+        - _rows: map each game name to its row
+        - _urls: the url of each game, indexed by row
+        - _tags: map each tag to its column
+        - _row_indptr, _row_indices, _row_data: the game vectors in compressed sparse row form
+        - _col_indptr, _col_indices, _col_data: the game vectors in compressed sparse column
+          form
+
+    Representation Invariants:
+        - len(self.names) == len(self._urls) == len(self._rows)
+        - all(self._rows[self.names[i]] == i for i in range(len(self.names)))
+    """
+    names: list[str]
+    _rows: dict[str, int]
+    _urls: list[str]
+    _tags: dict[str, int]
+    _row_indptr: np.ndarray
+    _row_indices: np.ndarray
+    _row_data: np.ndarray
+    _col_indptr: np.ndarray
+    _col_indices: np.ndarray
+    _col_data: np.ndarray
+
+    def __init__(self, games: list[list]) -> None:
+        """Build the index of the given games, in the format of
+        project.filter_for_game_graph: [['game_name', 'game_id', 'tags', 'url'], ...].
+
+        When several games have the same name, only the first one is kept, the same way as
+        the game vertices of the recommendation graph.
+        """
+        self.names, self._urls, self._rows, self._tags = [], [], {}, {}
+        game_tags = []
+        for name, _, tags, url in games:
+            if name in self._rows or name == 'N/A':
+                continue
+            self._rows[name] = len(self.names)
+            self.names.append(name)
+            self._urls.append(url)
+            tags = [] if tags == 'N/A' else list(dict.fromkeys(tags))
+            game_tags.append([self._tags.setdefault(tag, len(self._tags)) for tag in tags])
+
+        counts = np.array([len(tags) for tags in game_tags], dtype=np.int64)
+        indices = np.array([t for tags in game_tags for t in tags], dtype=np.int32)
+        rows = np.repeat(np.arange(len(self.names)), counts)
+        document_frequency = np.bincount(indices, minlength=len(self._tags))
+        data = np.log((1 + len(self.names)) / (1 + document_frequency[indices])) + 1
+        lengths = np.sqrt(np.bincount(rows, weights=data ** 2, minlength=len(self.names)))
+        data = (data / lengths[rows]).astype(np.float32)
+
+        self._row_indptr = np.concatenate([[0], np.cumsum(counts)])
+        self._row_indices, self._row_data = indices, data
+        order = np.argsort(indices, kind='stable')
+        self._col_indptr = np.concatenate([[0], np.cumsum(document_frequency)])
+        self._col_indices, self._col_data = rows[order].astype(np.int32), data[order]
+
+    @classmethod
+    def from_file(cls, game_names_file: str) -> TagIndex:
+        """Return the index of every game in the given steam games file.
+        """
+        import project
+        return cls(project.filter_for_game_graph(game_names_file))
+
+    def __contains__(self, game: Any) -> bool:
+        """Return whether the given game is in this index.
+        """
+        return game in self._rows
+
+    def get_url(self, game: str) -> str:
+        """Return the url page of the given game.
+
+        Preconditions:
+            - game in self
+        """
+        return self._urls[self._rows[game]]
+
+    def similarity_scores(self, game: str) -> np.ndarray:
+        """Return the cosine similarity between the tags of the given game and those of every
+        game, as an array indexed by row. The score of the game with itself is 0.
+
+        Preconditions:
+            - game in self
+        """
+        i = self._rows[game]
+        start, end = self._row_indptr[i], self._row_indptr[i + 1]
+        tags, weights = self._row_indices[start:end], self._row_data[start:end]
+        starts, ends = self._col_indptr[tags], self._col_indptr[tags + 1]
+        lengths = ends - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) \
+            + np.arange(int(lengths.sum()))
+        scores = np.bincount(self._col_indices[offsets],
+                             weights=self._col_data[offsets].astype(np.float64)
+                             * np.repeat(weights.astype(np.float64), lengths),
+                             minlength=len(self.names))
+        scores[i] = 0
+        return scores
+
+    def top_similar(self, game: str, limit: int) -> list[tuple[str, float]]:
+        """Return the (game, score) pairs of the limit games whose tags are the most similar to
+        those of the given game, best first, with ties ordered by name descending.
+
+        Preconditions:
+            - game in self
+        """
+        return self._top_positive(self.similarity_scores(game), limit)
+
+    def blend(self, game: str, review_scores: dict[str, float], tag_weight: float,
+              limit: int) -> list[tuple[str, float]]:
+        """Return the (game, score) pairs of the limit games with the highest positive blended
+        score with the given game, best first, with ties ordered by name descending.
+
+        The blended score of a game is (1 - tag_weight) times its review-based score, given by
+        review_scores for the games with a nonzero one, plus tag_weight times its tag score.
+        The given game need not be in this index; its tag scores are then all 0.
+
+        Preconditions:
+            - 0 <= tag_weight <= 1
+            - game not in review_scores
+        """
+        scores = self.similarity_scores(game) * tag_weight if game in self._rows \
+            else np.zeros(len(self.names))
+        # review-scored games that are missing from the catalog are ranked on the side
+        outside = []
+        for other, score in review_scores.items():
+            if other in self._rows:
+                scores[self._rows[other]] += (1 - tag_weight) * score
+            else:
+                outside.append((other, (1 - tag_weight) * score))
+
+        best = self._top_positive(scores, limit)
+        if outside:
+            best = top_k(best + [(other, s) for other, s in outside if s > 0], limit)
+        return best
+
+    def _top_positive(self, scores: np.ndarray, limit: int) -> list[tuple[str, float]]:
+        """Return the (game, score) pairs of the limit highest positive scores, indexed by row,
+        best first, with ties ordered by name descending.
+        """
+        candidates = np.flatnonzero(scores > 0)
+        best = top_k_indices(scores[candidates], [self.names[j] for j in candidates.tolist()],
+                             limit)
+        return [(self.names[j], float(scores[j])) for j in candidates[best].tolist()]
+
+
+if __name__ == '__main__':
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'ranking', 'project'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
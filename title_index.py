@@ -0,0 +1,192 @@
+"""
+CSC111 Final Project: Prefix and typo-tolerant lookup of game titles
+"""
+from __future__ import annotations
+from typing import Iterable, Optional
+import bisect
+import numpy as np
+from ranking import top_k_indices
+
+# the most titles added after the trigram postings were built before they are rebuilt
+_MAX_UNINDEXED = 256
+
+
+class TitleIndex:
+    """A lookup index over game titles, ignoring capitalization.
+
+    Titles are compared by their case-folded keys. The keys are kept in a sorted list, so the
+    titles that start with a prefix are found by binary search. For typos, every key is split
+    into the trigrams of ' ' + key + ' ', and the titles sharing the most trigrams with a
+    query, relative to the trigrams of both (their Jaccard similarity), are found by counting
+    over the postings of the query's trigrams only.
+
+    Instance Attributes:
+        - titles: the titles in this index, indexed by id
+
+    Private Instance Attributes:
+        - _keys: the case-folded key of every title, indexed by id
+        - _sorted: the (key, id) pair of every title, sorted
+        - _by_key: map each key to the ids of the titles with that key
+        - _postings: map each trigram to the ids of the titles, as of the last build, that
+          contain it
+        - _sizes: the number of distinct trigrams of every title, as of the last build,
+          indexed by id
+        - _unindexed: the ids of the titles added since the postings were last built, which
+          are the last ids
+
+    Representation Invariants:
+        - len(self.titles) == len(self._keys) == len(self._sorted)
+        - len(self._sizes) + len(self._unindexed) == len(self.titles)
+        - self._sorted == sorted(self._sorted)
+
+    >>> index = TitleIndex(['Portal 2', 'Portal', 'Team Fortress 2', 'Terraria'])
+    >>> index.resolve('portal 2')
+    'Portal 2'
+    >>> index.complete('te', 5)
+    ['Team Fortress 2', 'Terraria']
+    >>> index.fuzzy('team fortres', 1)
+    ['Team Fortress 2']
+    """
+    titles: list[str]
+    _keys: list[str]
+    _sorted: list[tuple[str, int]]
+    _by_key: dict[str, list[int]]
+    _postings: dict[str, np.ndarray]
+    _sizes: np.ndarray
+    _unindexed: list[int]
+
+    def __init__(self, titles: Iterable[str]) -> None:
+        """Build the index of the given titles. The order of suggestions does not depend on
+        the order of the titles.
+        """
+        self.titles, self._keys, self._sorted, self._by_key = [], [], [], {}
+        self._unindexed = []
+        for title in sorted(set(titles)):
+            self._append(title)
+        self._sorted = sorted((key, title_id) for title_id, key in enumerate(self._keys))
+        self._build_postings()
+
+    def __len__(self) -> int:
+        """Return the number of titles in this index.
+        """
+        return len(self.titles)
+
+    def add(self, title: str) -> None:
+        """Add the given title to this index, if it is not in it yet.
+        """
+        if any(self.titles[i] == title for i in self._by_key.get(title.casefold(), ())):
+            return
+        title_id = self._append(title)
+        bisect.insort(self._sorted, (self._keys[title_id], title_id))
+        self._unindexed.append(title_id)
+        if len(self._unindexed) > _MAX_UNINDEXED:
+            self._build_postings()
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Return the title the given name refers to: the title equal to it if there is one,
+        else the first title, alphabetically, that is equal to it ignoring capitalization.
+        Return None if there is none.
+        """
+        ids = self._by_key.get(name.casefold(), [])
+        if not ids:
+            return None
+        matches = [self.titles[i] for i in ids]
+        return name if name in matches else min(matches)
+
+    def complete(self, prefix: str, limit: int = 10) -> list[str]:
+        """Return the first limit titles, in the order of their keys, that start with the
+        given prefix, ignoring capitalization.
+
+        Preconditions:
+            - limit >= 0
+        """
+        key = prefix.casefold()
+        completions = []
+        position = bisect.bisect_left(self._sorted, (key, -1))
+        while position < len(self._sorted) and len(completions) < limit \
+                and self._sorted[position][0].startswith(key):
+            completions.append(self.titles[self._sorted[position][1]])
+            position += 1
+        return completions
+
+    def fuzzy(self, query: str, limit: int = 10) -> list[str]:
+        """Return the limit titles with the highest trigram similarity to the given query,
+        ignoring capitalization, best first, with ties ordered by title descending. Only the
+        titles that share a trigram with the query are returned.
+
+        Preconditions:
+            - limit >= 0
+        """
+        grams = _trigrams(query.casefold())
+        lists = [self._postings[gram] for gram in grams if gram in self._postings]
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.titles)) \
+            if lists else np.zeros(len(self.titles), dtype=np.int64)
+        sizes = self._sizes
+        if self._unindexed:
+            unindexed = [_trigrams(self._keys[title_id]) for title_id in self._unindexed]
+            shared[self._unindexed] = [len(grams & other) for other in unindexed]
+            sizes = np.concatenate([sizes, [len(other) for other in unindexed]])
+
+        candidates = np.flatnonzero(shared)
+        scores = shared[candidates] / (len(grams) + sizes[candidates] - shared[candidates])
+        best = top_k_indices(scores, [self.titles[j] for j in candidates.tolist()], limit)
+        return [self.titles[candidates[b]] for b in best]
+
+    def suggest(self, query: str, limit: int = 10) -> list[str]:
+        """Return at most limit titles for the given query: the titles that start with it
+        first, then the titles that are the most similar to it.
+
+        Preconditions:
+            - limit >= 0
+        """
+        suggestions = self.complete(query, limit)
+        if len(suggestions) < limit and query.strip():
+            seen = set(suggestions)
+            suggestions.extend([title for title in self.fuzzy(query, limit)
+                                if title not in seen][:limit - len(suggestions)])
+        return suggestions
+
+    def _append(self, title: str) -> int:
+        """Add the given title to the lists of this index, except _sorted and the postings,
+        and return its id.
+        """
+        title_id, key = len(self.titles), title.casefold()
+        self.titles.append(title)
+        self._keys.append(key)
+        self._by_key.setdefault(key, []).append(title_id)
+        return title_id
+
+    def _build_postings(self) -> None:
+        """Rebuild the trigram postings from every title in this index.
+        """
+        postings, sizes = {}, []
+        for title_id, key in enumerate(self._keys):
+            grams = _trigrams(key)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(title_id)
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._sizes = np.array(sizes, dtype=np.float64)
+        self._unindexed = []
+
+
+def _trigrams(key: str) -> set[str]:
+    """Return the distinct trigrams of the given key, padded with one space on each side.
+
+    >>> sorted(_trigrams('abc'))
+    [' ab', 'abc', 'bc ']
+    """
+    padded = ' ' + key + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['bisect', 'numpy', 'ranking'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })